@@ -0,0 +1,42 @@
+"""Micro-benchmark for 16bpp (RGB555) XOR decoding in BMPParser.
+
+Compares the vectorized decoder against the original per-pixel loop and checks that both produce identical bytes.
+
+    python -m benchmarks.bmp16
+"""
+import os
+import timeit
+
+from cursorgen.parser import BMPParser
+
+SIZES = [32, 64, 128, 256]
+
+
+def decode_rgb555_loop(data: bytes) -> bytes:
+    images_data = []
+    for i in range(0, len(data), 2):
+        value = int.from_bytes(data[i : i + 2], byteorder="little")
+        b = (value & 0x7C00) >> 10
+        g = (value & 0x3E0) >> 5
+        r = value & 0x1F
+        r = (r << 3) | (r >> 2)
+        g = (g << 3) | (g >> 2)
+        b = (b << 3) | (b >> 2)
+        images_data.append((r << 16 | g << 8 | b).to_bytes(3, byteorder="little"))
+    return b"".join(images_data)
+
+
+def main() -> None:
+    print(f"{'size':>6} {'loop (ms)':>12} {'numpy (ms)':>12} {'speedup':>9}")
+    for size in SIZES:
+        data = os.urandom(BMPParser._row_size(16, size) * size)
+        assert BMPParser._decode_rgb555(data) == decode_rgb555_loop(data)
+
+        number = max(1, 4096 // size)
+        loop = min(timeit.repeat(lambda: decode_rgb555_loop(data), number=number, repeat=3)) / number
+        vectorized = min(timeit.repeat(lambda: BMPParser._decode_rgb555(data), number=number, repeat=3)) / number
+        print(f"{size:>6} {loop * 1000:>12.3f} {vectorized * 1000:>12.3f} {loop / vectorized:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
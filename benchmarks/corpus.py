@@ -0,0 +1,155 @@
+"""Synthetic cursor corpus for benchmarks.
+
+Builds CUR, ANI and Xcursor files covering every BMP bit depth (with and without a palette), PNG entries, a range of
+sizes and frame counts, and ANI files with and without `seq `/`rate` chunks. Pixel data is pseudo-random but
+deterministic.
+
+    python -m benchmarks.corpus OUTPUT_DIR
+"""
+import io
+import os
+import random
+import sys
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from cursorgen.parser import ANIParser, BMPParser, CURParser, XCursorParser
+
+BPPS = [1, 4, 8, 16, 24, 32]
+SIZES = [32, 64, 128, 256]
+FRAME_COUNTS = [4, 16, 64]
+
+
+def _random_bytes(rng: random.Random, count: int) -> bytes:
+    return rng.getrandbits(count * 8).to_bytes(count, "little") if count else b""
+
+
+def dib(size: int, bpp: int, palette: bool = True, seed: int = 0) -> bytes:
+    """Builds a cursor DIB (header, optional palette, XOR and AND masks) of size x size pixels."""
+    rng = random.Random(seed)
+    header = BMPParser.DIB_HEADER.pack(BMPParser.DIB_HEADER.size, size, size * 2, 1, bpp, 0, 0, 0, 0, 0, 0)
+    colors = bytearray()
+    if bpp <= 8 and palette:
+        # RGBQUAD entries with the reserved byte cleared.
+        colors = bytearray(_random_bytes(rng, (1 << bpp) * 4))
+        colors[3::4] = bytes(1 << bpp)
+    xor = _random_bytes(rng, BMPParser._row_size(bpp, size) * size)
+    mask = _random_bytes(rng, BMPParser._mask_size(size) * size)
+    return header + bytes(colors) + xor + mask
+
+
+def png(size: int, seed: int = 0) -> bytes:
+    """Builds a size x size RGBA PNG, as embedded in Vista style cursors."""
+    rng = random.Random(seed)
+    image = Image.frombytes("RGBA", (size, size), _random_bytes(rng, size * size * 4))
+    with io.BytesIO() as f:
+        image.save(f, format="PNG")
+        return f.getvalue()
+
+
+def cur(images: Iterable[Tuple[int, bytes]], hotspot: Tuple[int, int] = (0, 0)) -> bytes:
+    """Builds a CUR file from (size, DIB) pairs."""
+    images = list(images)
+    offset = CURParser.ICON_DIR.size + CURParser.ICON_DIR_ENTRY.size * len(images)
+    entries = [CURParser.ICON_DIR.pack(0, CURParser.ICO_TYPE_CUR, len(images))]
+    for size, data in images:
+        entries.append(CURParser.ICON_DIR_ENTRY.pack(size % 256, size % 256, 0, 0, *hotspot, len(data), offset))
+        offset += len(data)
+    return b"".join(entries + [data for _, data in images])
+
+
+def _chunk(name: bytes, data: bytes) -> bytes:
+    return ANIParser.CHUNK_HEADER.pack(name, len(data)) + data + b"\0" * (len(data) & 1)
+
+
+def ani(
+    icons: Sequence[bytes],
+    sequence: Optional[Sequence[int]] = None,
+    rates: Optional[Sequence[int]] = None,
+    display_rate: int = 5,
+) -> bytes:
+    """Builds an ANI file from CUR icons, optionally with `seq ` and `rate` chunks."""
+    steps = len(sequence) if sequence is not None else len(icons)
+    flags = ANIParser.ICON_FLAG | (ANIParser.SEQUENCE_FLAG if sequence is not None else 0)
+    header = ANIParser.ANIH_HEADER.pack(ANIParser.ANIH_HEADER.size, len(icons), steps, 0, 0, 0, 0, display_rate, flags)
+    chunks = [_chunk(ANIParser.HEADER_CHUNK, header)]
+    if rates is not None:
+        chunks.append(_chunk(ANIParser.RATE_CHUNK, b"".join(ANIParser.UNSIGNED.pack(rate) for rate in rates)))
+    if sequence is not None:
+        chunks.append(_chunk(ANIParser.SEQ_CHUNK, b"".join(ANIParser.UNSIGNED.pack(step) for step in sequence)))
+    frames = ANIParser.FRAME_TYPE + b"".join(_chunk(ANIParser.ICON_CHUNK, icon) for icon in icons)
+    chunks.append(_chunk(ANIParser.LIST_CHUNK, frames))
+    body = b"".join(chunks)
+    return ANIParser.RIFF_HEADER.pack(ANIParser.SIGNATURE, len(body) + 4, ANIParser.ANI_TYPE) + body
+
+
+def xcursor(sizes: Iterable[int], frame_count: int, seed: int = 0) -> bytes:
+    """Builds an Xcursor file with frame_count frames at every nominal size."""
+    rng = random.Random(seed)
+    images: List[Tuple[int, bytes]] = []
+    for _ in range(frame_count):
+        for size in sizes:
+            header = XCursorParser.IMAGE_HEADER.pack(
+                XCursorParser.IMAGE_HEADER.size, XCursorParser.CHUNK_IMAGE, size, 1, size, size, 0, 0, 50
+            )
+            images.append((size, header + _random_bytes(rng, size * size * 4)))
+
+    toc = []
+    offset = XCursorParser.FILE_HEADER.size + XCursorParser.TOC_CHUNK.size * len(images)
+    for size, chunk in images:
+        toc.append(XCursorParser.TOC_CHUNK.pack(XCursorParser.CHUNK_IMAGE, size, offset))
+        offset += len(chunk)
+    header = XCursorParser.FILE_HEADER.pack(
+        XCursorParser.MAGIC, XCursorParser.FILE_HEADER.size, XCursorParser.VERSION, len(images)
+    )
+    return b"".join([header] + toc + [chunk for _, chunk in images])
+
+
+def dibs() -> Dict[str, Tuple[int, bytes]]:
+    """Raw (size, DIB) pairs for every BMPParser decoding path."""
+    cases = {}
+    for bpp in BPPS:
+        for size in SIZES:
+            cases[f"{bpp}bpp-{size}px"] = (size, dib(size, bpp, seed=bpp * size))
+            if bpp <= 8:
+                cases[f"{bpp}bpp-{size}px-nopalette"] = (size, dib(size, bpp, palette=False, seed=bpp * size))
+    return cases
+
+
+def corpus() -> Dict[str, bytes]:
+    """Named cursor files of every supported container format."""
+    cases = {}
+    for name, image in dibs().items():
+        cases[f"cur-{name}"] = cur([image])
+    cases["cur-multi-32-48-64"] = cur((size, dib(size, 32, seed=size)) for size in (32, 48, 64))
+    cases["cur-png-256px"] = cur([(256, png(256))])
+    cases["cur-multi-32-48-png256"] = cur([(32, dib(32, 32, seed=32)), (48, dib(48, 32, seed=48)), (256, png(256))])
+
+    for count in FRAME_COUNTS:
+        icons = [cur([(32, dib(32, 32, seed=i))]) for i in range(count)]
+        cases[f"ani-{count}f"] = ani(icons)
+        cases[f"ani-{count}f-rate"] = ani(icons, rates=[i % 7 + 1 for i in range(count)])
+        looped = [i // 2 for i in range(count)] + list(reversed(range(count)))
+        cases[f"ani-{count}f-seq"] = ani(icons, sequence=looped)
+        cases[f"ani-{count}f-seq-rate"] = ani(icons, sequence=looped, rates=[i % 7 + 1 for i in range(len(looped))])
+
+    cases["xcursor-1f"] = xcursor([24, 32, 48], 1)
+    cases["xcursor-16f"] = xcursor([24, 32, 48, 64], 16)
+    return cases
+
+
+def main() -> None:
+    if len(sys.argv) != 2:
+        sys.exit(f"usage: {sys.argv[0]} OUTPUT_DIR")
+
+    output = sys.argv[1]
+    os.makedirs(output, exist_ok=True)
+    for name, data in corpus().items():
+        extension = name.split("-")[0]
+        with open(os.path.join(output, f"{name}.{extension}"), "wb") as f:
+            f.write(data)
+
+
+if __name__ == "__main__":
+    main()
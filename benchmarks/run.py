@@ -0,0 +1,121 @@
+"""Timed benchmarks over the synthetic corpus, emitted as JSON for comparison across commits.
+
+    python -m benchmarks.run [-o results.json] [-k FILTER] [--repeat N]
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from functools import partial
+from typing import Any, Callable, Dict, List
+
+import numpy
+import PIL
+
+from benchmarks.corpus import corpus, dibs
+from cursorgen.parser import (
+    ANIParser,
+    BMPParser,
+    CURParser,
+    XCursorParser,
+    inspect_blob,
+    open_blob,
+)
+from cursorgen.parser.base import BaseParser
+from cursorgen.writer import to_x11
+
+PARSERS = {"cur": CURParser, "ani": ANIParser, "xcursor": XCursorParser}
+
+
+def decode(parse: Callable[[bytes], BaseParser], data: bytes) -> BaseParser:
+    """Parses data and forces decoding of lazily loaded images."""
+    cursor = parse(data)
+    for frame in cursor.frames:
+        for image in frame:
+            image.pixels
+    return cursor
+
+
+def stream(data: bytes) -> bytes:
+    """Parses and converts data with images decoded only while they are written."""
+    return to_x11(open_blob(data).iter_frames(), stream=True)
+
+
+def measure(func: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, Any]:
+    func()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - start >= min_time or number >= 1 << 16:
+            break
+        number *= 2
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return {"min": min(timings), "mean": sum(timings) / len(timings), "max": max(timings), "loops": number}
+
+
+def benchmarks() -> Dict[str, Callable[[], Any]]:
+    cases: Dict[str, Callable[[], Any]] = {}
+    for name, (_, data) in dibs().items():
+        cases[f"bmp/{name}"] = partial(BMPParser, data)
+
+    for name, data in corpus().items():
+        parser = PARSERS[name.split("-")[0]]
+        cases[f"open_blob/{name}"] = partial(decode, open_blob, data)
+        cases[f"parse/{name}"] = partial(decode, parser, data)
+        cases[f"inspect_blob/{name}"] = partial(inspect_blob, data)
+
+        if not name.startswith("cur-") or "32px" in name or "multi" in name:
+            cursor = decode(open_blob, data)
+            cases[f"to_x11/{name}"] = partial(to_x11, cursor.frames)
+            if name == "ani-64f":
+                cases[f"to_x11-4workers/{name}"] = partial(to_x11, cursor.frames, workers=4)
+                cases[f"to_x11-stream/{name}"] = partial(stream, data)
+            if name == "xcursor-16f":
+                cases[f"to_x11-passthrough/{name}"] = partial(to_x11, cursor.frames, passthrough=True)
+            if name == "cur-multi-32-48-64":
+                for resample in ("box", "lanczos"):
+                    cases[f"to_x11-{resample}/{name}"] = partial(to_x11, cursor.frames, resample=resample)
+    return cases
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Runs cursorgen benchmarks.")
+    parser.add_argument("-o", "--output", help="File to write JSON results to (default: stdout).")
+    parser.add_argument("-k", "--filter", default="", help="Only run benchmarks whose name contains this string.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed repetitions per benchmark.")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum duration of one repetition in seconds.")
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    for name, func in benchmarks().items():
+        if args.filter not in name:
+            continue
+        result = measure(func, args.repeat, args.min_time)
+        results.append({"name": name, **result})
+        print(f"{name:<48} {result['min'] * 1000:>10.3f} ms", file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": numpy.__version__,
+        "pillow": PIL.__version__,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
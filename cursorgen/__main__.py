@@ -1,23 +1,48 @@
 import argparse
+import json
 import os
 import sys
-import traceback
-from multiprocessing import cpu_count
-from multiprocessing.pool import ThreadPool
-from threading import Lock
-from typing import BinaryIO
+from functools import partial
+from typing import List, Tuple
 
-from cursorgen.parser import open_blob
-from cursorgen.writer import to_x11
+# The worker pools, the pipeline and the server are imported where they are used, and PIL and NumPy only once
+# pixels are decoded or written, so that --help and --identify start quickly.
+from cursorgen.convert import Result, convert_job
+from cursorgen.identify import identify
+from cursorgen.utils.cache import ConversionCache
+from cursorgen.utils.limits import Limits
+from cursorgen.utils.stats import Stats
+from cursorgen.utils.theme import (
+    ThemePlan,
+    WindowsTheme,
+    plan_theme,
+    read_theme,
+    theme_dir_name,
+    write_index_theme,
+    write_links,
+)
+from cursorgen.writer.x11 import RESAMPLE
+
+CPU_COUNT = os.cpu_count() or 1
 
 
 def main() -> None:
-    parser = argparse.ArgumentParser(description="Converts Windows cursors to X11 cursors.")
+    if sys.argv[1:2] == ["serve"]:
+        serve_main(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(
+        description="Converts Windows cursors to X11 cursors. Run `cursorgen serve --help` for server mode."
+    )
     parser.add_argument(
         "files",
-        type=argparse.FileType("rb"),
         nargs="+",
-        help="Windows cursor files to convert (*.cur, *.ani)",
+        help="Windows cursor files to convert (*.cur, *.ani), or theme directories with --theme",
+    )
+    parser.add_argument(
+        "--identify",
+        action="store_true",
+        help="Only print the format and basic header fields of each file, without decoding or converting it.",
     )
     parser.add_argument(
         "-o",
@@ -26,28 +51,340 @@ def main() -> None:
         default=os.curdir,
         help="Directory to store converted cursor files.",
     )
+    parser.add_argument(
+        "--theme",
+        action="store_true",
+        help="Convert Windows cursor theme directories with an install.inf into X11 themes (cursors/ and "
+        "index.theme) in the output directory. Each source file is converted once, other names are symlinked.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=CPU_COUNT,
+        help="Number of files to convert in parallel (default: number of CPUs).",
+    )
+    parser.add_argument(
+        "--resize-workers",
+        type=int,
+        default=1,
+        help="Number of threads resizing the images of each file, for large animated cursors (default: 1).",
+    )
+    parser.add_argument(
+        "--processes",
+        action="store_true",
+        help="Convert in worker processes instead of threads, so conversion is not limited by the GIL. Each worker "
+        "reads and writes its own files, so only paths and status cross process boundaries.",
+    )
+    parser.add_argument(
+        "--coalesce",
+        action="store_true",
+        help="Merge consecutive identical animation frames into one, summing their delays.",
+    )
+    parser.add_argument(
+        "--resample",
+        choices=list(RESAMPLE),
+        default="nearest",
+        help="Filter used to scale images to each target size (default: nearest). Integer upscales with nearest or "
+        "box are plain pixel replication.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Decode each image only while it is written, so memory use does not grow with the length of an "
+        "animation. Images are decoded twice, the output is the same.",
+    )
+    parser.add_argument(
+        "--passthrough",
+        action="store_true",
+        help="Copy the images of Xcursor inputs unchanged at the sizes they already have, and only scale images for "
+        "the missing sizes.",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Read, convert and write in separate overlapping stages on threads, holding at most --max-inflight "
+        "bytes at once.",
+    )
+    parser.add_argument(
+        "--max-inflight",
+        type=int,
+        default=256,
+        help="Maximum input and output data held by --pipeline in MiB (default: 256).",
+    )
+    parser.add_argument(
+        "--mmap",
+        action="store_true",
+        help="Map input files into memory instead of reading them.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory of previously converted files to reuse when an input and the settings are unchanged.",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=1024,
+        help="Maximum size of the conversion cache in MiB (default: 1024).",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Report per-stage timings, counters and peak traced memory as a summary on stderr. Peak memory is per "
+        "file only with --processes or --jobs 1.",
+    )
+    parser.add_argument(
+        "--stats-format",
+        choices=["text", "json"],
+        help="Format of --stats, which it implies: a summary on stderr (text), or per file on stdout (json).",
+    )
+    add_limit_arguments(parser)
 
     args = parser.parse_args()
-    print_lock = Lock()
+    if args.identify:
+        sys.exit(identify_main(args.files))
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.resize_workers < 1:
+        parser.error("--resize-workers must be at least 1")
+    if args.pipeline and args.mmap:
+        parser.error("--mmap cannot be used with --pipeline")
+    if args.pipeline and args.processes:
+        # Pipeline stages pass whole files between processes; process workers read and write their own files instead.
+        parser.error("--processes cannot be used with --pipeline")
+    limits = parse_limits(parser, args)
+    stats_format = args.stats_format or ("text" if args.stats else None)
+
+    jobs: List[Tuple[str, str]] = []
+    themes: List[Tuple[str, WindowsTheme, ThemePlan]] = []
+    if args.theme:
+        for directory in args.files:
+            try:
+                theme = read_theme(directory)
+            except (OSError, ValueError) as e:
+                print(f"Error occurred while reading theme {directory}: {e}", file=sys.stderr)
+                continue
+            theme_dir = os.path.join(args.output, theme_dir_name(theme))
+            cursors_dir = os.path.join(theme_dir, "cursors")
+            os.makedirs(cursors_dir, exist_ok=True)
+            plan = plan_theme(theme)
+            jobs += [(source, os.path.join(cursors_dir, name)) for source, name in plan.conversions.items()]
+            themes.append((theme_dir, theme, plan))
+    else:
+        jobs = [(name, os.path.join(args.output, os.path.splitext(os.path.basename(name))[0])) for name in args.files]
+
+    chunksize, extra = divmod(len(jobs), args.jobs * 4)
+    # At least 1, even when no theme had anything to convert.
+    chunksize = max(1, chunksize + bool(extra))
+
+    hits = misses = 0
+    file_stats: List[Stats] = []
 
-    def process(file: BinaryIO) -> None:
-        name = file.name
-        blob = file.read()
+    def handle(result: Result) -> None:
+        nonlocal hits, misses
+        if result.stats is not None:
+            file_stats.append(result.stats)
+        if result.error is not None:
+            print(f"Error occurred while processing {result.name}:", file=sys.stderr)
+            print(result.error, end="", file=sys.stderr)
+        if result.cache_hit is not None:
+            hits += result.cache_hit
+            misses += not result.cache_hit
+
+    if args.pipeline:
+        from concurrent.futures import ThreadPoolExecutor
+
+        from cursorgen.pipeline import run_pipeline
+
+        with ThreadPoolExecutor(args.jobs) as executor:
+            run_pipeline(
+                jobs,
+                executor,
+                args.jobs,
+                handle,
+                args.max_inflight * 1024 * 1024,
+                cache_dir=args.cache_dir,
+                stats=stats_format is not None,
+                coalesce=args.coalesce,
+                resample=args.resample,
+                resize_workers=args.resize_workers,
+                stream=args.stream,
+                passthrough=args.passthrough,
+                limits=limits,
+            )
+    else:
+        from multiprocessing import Pool
+        from multiprocessing.pool import ThreadPool
+
+        pool_cls = Pool if args.processes else ThreadPool
+        with pool_cls(args.jobs) as pool:
+            worker = partial(
+                convert_job,
+                use_mmap=args.mmap,
+                cache_dir=args.cache_dir,
+                stats=stats_format is not None,
+                coalesce=args.coalesce,
+                resample=args.resample,
+                resize_workers=args.resize_workers,
+                stream=args.stream,
+                passthrough=args.passthrough,
+                limits=limits,
+            )
+            for result in pool.imap_unordered(worker, jobs, chunksize):
+                handle(result)
+
+    for theme_dir, theme, plan in themes:
+        for name, target in write_links(os.path.join(theme_dir, "cursors"), plan.links):
+            print(f"Skipping link {name} in {theme_dir}: {target} was not converted", file=sys.stderr)
+        write_index_theme(theme_dir, theme.name)
+
+    if args.cache_dir is not None:
+        ConversionCache(args.cache_dir, args.cache_size * 1024 * 1024).prune()
+        print(f"Cache: {hits} hits, {misses} misses", file=sys.stderr)
+
+    if stats_format is not None:
+        report_stats(file_stats, stats_format)
+
+
+def add_limit_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = Limits()
+    group = parser.add_argument_group(
+        "limits",
+        "Bounds on the work a single input file can cause, checked from its headers before images are decoded. "
+        "Files over a limit are skipped and reported.",
+    )
+    group.add_argument(
+        "--max-pixels",
+        type=int,
+        default=defaults.pixels,
+        help=f"Maximum total pixels of the decoded images of a file (default: {defaults.pixels}).",
+    )
+    group.add_argument(
+        "--max-frames",
+        type=int,
+        default=defaults.frames,
+        help=f"Maximum number of animation frames (default: {defaults.frames}).",
+    )
+    group.add_argument(
+        "--max-steps",
+        type=int,
+        default=defaults.steps,
+        help=f"Maximum number of animation steps (default: {defaults.steps}).",
+    )
+    group.add_argument(
+        "--max-chunks",
+        type=int,
+        default=defaults.chunks,
+        help=f"Maximum number of chunks in an input file, and of images written (default: {defaults.chunks}).",
+    )
+    group.add_argument(
+        "--max-output",
+        type=int,
+        default=defaults.output_bytes >> 20,
+        help=f"Maximum size of a converted file in MiB (default: {defaults.output_bytes >> 20}).",
+    )
+    group.add_argument(
+        "--timeout",
+        type=float,
+        help="Give up on a file after converting it for this many seconds (default: no limit).",
+    )
+
+
+def parse_limits(parser: argparse.ArgumentParser, args: argparse.Namespace) -> Limits:
+    for name in ("max_pixels", "max_frames", "max_steps", "max_chunks", "max_output"):
+        if getattr(args, name) < 1:
+            parser.error(f"--{name.replace('_', '-')} must be at least 1")
+    if args.timeout is not None and args.timeout <= 0:
+        parser.error("--timeout must be positive")
+    return Limits(
+        pixels=args.max_pixels,
+        frames=args.max_frames,
+        steps=args.max_steps,
+        chunks=args.max_chunks,
+        output_bytes=args.max_output << 20,
+        seconds=args.timeout,
+    )
+
+
+def serve_main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="cursorgen serve",
+        description="Converts cursor files on request, with a warm worker pool. Reads newline-delimited JSON requests "
+        'such as {"id": 1, "input": "in.ani", "output": "out/", "coalesce": true} from stdin, or from each connection '
+        "to --socket, and answers each with a JSON line holding its status and timing.",
+    )
+    parser.add_argument("--socket", help="Listen on this Unix socket path instead of stdin and stdout.")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=CPU_COUNT,
+        help="Number of requests to convert in parallel (default: number of CPUs).",
+    )
+    parser.add_argument(
+        "--processes",
+        action="store_true",
+        help="Convert in worker processes instead of threads, so conversion is not limited by the GIL.",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=1024,
+        help="Maximum size in MiB of conversion caches named by requests, enforced on exit (default: 1024).",
+    )
+    add_limit_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    limits = parse_limits(parser, args)
+
+    import multiprocessing
+    from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+    from cursorgen.server import serve
+
+    executor: Executor
+    if args.processes:
+        # Workers are started on demand from inside the event loop. Forked there, they would inherit client
+        # connections (so closing one never reaches the client) and the loop's signal handlers.
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        executor = ProcessPoolExecutor(args.jobs, mp_context=multiprocessing.get_context(method))
+    else:
+        executor = ThreadPoolExecutor(args.jobs)
+    with executor:
         try:
-            cursor = open_blob(blob)
-        except Exception:
-            with print_lock:
-                print(f"Error occurred while processing {name}:", file=sys.stderr)
-                traceback.print_exc()
-        else:
-            result = to_x11(cursor.frames)
-            output = os.path.join(args.output, os.path.splitext(os.path.basename(name))[0])
-
-            with open(f"{output}", "wb") as f:
-                f.write(result)
-
-    with ThreadPool(cpu_count()) as pool:
-        pool.map(process, args.files)
+            serve(executor, args.socket, args.cache_size * 1024 * 1024, limits)
+        except FileExistsError as e:
+            parser.error(str(e))
+
+
+def identify_main(files: List[str]) -> int:
+    status = 0
+    for name in files:
+        try:
+            with open(name, "rb") as f:
+                description = identify(f.read())
+        except (OSError, ValueError) as e:
+            print(f"{name}: {e}", file=sys.stderr)
+            status = 1
+            continue
+        print(f"{name}: {description}")
+    return status
+
+
+def report_stats(file_stats: List[Stats], output_format: str) -> None:
+    total = Stats("total", files=0)
+    for stats in file_stats:
+        total.merge(stats)
+
+    if output_format == "json":
+        json.dump({"total": total.to_dict(), "files": [stats.to_dict() for stats in file_stats]}, sys.stdout)
+        print()
+    else:
+        print(total.format(), file=sys.stderr)
+        print("Slowest files:", file=sys.stderr)
+        for stats in sorted(file_stats, key=lambda stats: stats.wall, reverse=True)[:10]:
+            print(f"  {stats.format()}", file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+import mmap
+import os
+import sys
+import traceback
+from typing import Any, NamedTuple, Optional, Tuple
+
+from cursorgen.parser import open_blob
+from cursorgen.parser.base import Buffer
+from cursorgen.utils.cache import ConversionCache
+from cursorgen.utils.limits import LimitExceeded, Limits, enforce
+from cursorgen.utils.stats import Stats, collect, stage
+from cursorgen.writer import write_x11, x11
+
+
+class Result(NamedTuple):
+    name: str
+    error: Optional[str] = None
+    cache_hit: Optional[bool] = None
+    stats: Optional[Stats] = None
+
+
+def format_error() -> str:
+    """Formats the exception being handled for a Result; exceeded limits are reported without a traceback."""
+    error = sys.exc_info()[1]
+    if isinstance(error, LimitExceeded):
+        return f"{error}\n"
+    return traceback.format_exc()
+
+
+def import_decoders() -> None:
+    """Imports NumPy and Pillow's plugins ahead of a file's stats and time budget, instead of lazily while decoding."""
+    import numpy  # noqa: F401
+    from PIL import Image
+
+    Image.preinit()
+
+
+def convert(
+    name: str,
+    output: str,
+    use_mmap: bool = False,
+    cache_dir: Optional[str] = None,
+    stats: bool = False,
+    coalesce: bool = False,
+    resample: str = "nearest",
+    resize_workers: int = 1,
+    stream: bool = False,
+    passthrough: bool = False,
+    limits: Optional[Limits] = None,
+) -> Result:
+    """Converts a single cursor file to output, within limits, passing the other options on to write_x11.
+
+    Only paths and status cross the pool boundary, so the same function serves both thread and process pools.
+    """
+    if limits is None:
+        limits = Limits()
+    import_decoders()
+    if not stats:
+        return _convert(
+            name, output, use_mmap, cache_dir, coalesce, resample, resize_workers, stream, passthrough, limits
+        )
+
+    with collect(Stats(name)) as file_stats:
+        result = _convert(
+            name, output, use_mmap, cache_dir, coalesce, resample, resize_workers, stream, passthrough, limits
+        )
+    return result._replace(stats=file_stats)
+
+
+def convert_job(job: Tuple[str, str], **options: Any) -> Result:
+    return convert(*job, **options)
+
+
+def _convert(
+    name: str,
+    output: str,
+    use_mmap: bool,
+    cache_dir: Optional[str],
+    coalesce: bool,
+    resample: str,
+    resize_workers: int,
+    stream: bool,
+    passthrough: bool,
+    limits: Limits,
+) -> Result:
+    blob: Buffer
+    try:
+        with stage("read"), open(name, "rb") as file:
+            if use_mmap and os.fstat(file.fileno()).st_size:
+                blob = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                blob = file.read()
+    except Exception:
+        return Result(name, traceback.format_exc())
+
+    cache = None
+    missed = None if cache_dir is None else False
+    try:
+        if cache_dir is not None:
+            # Eviction only happens in the parent process, max_size is irrelevant here.
+            cache = ConversionCache(cache_dir, 0)
+            key = cache.key(blob, x11.VERSION, x11.SIZES, coalesce=coalesce, resample=resample, passthrough=passthrough)
+            with stage("write"):
+                if cache.fetch(key, output):
+                    return Result(name, cache_hit=True)
+
+        with enforce(limits):
+            try:
+                cursor = open_blob(blob)
+            except Exception:
+                return Result(name, format_error(), missed)
+
+            # Frames of animations are parsed, and images decoded, while they are written, so errors can surface here.
+            frames = cursor.iter_frames()
+            try:
+                if cache is not None:
+                    with cache.store(key) as f:
+                        write_x11(
+                            frames,
+                            f,
+                            coalesce=coalesce,
+                            resample=resample,
+                            workers=resize_workers,
+                            stream=stream,
+                            passthrough=passthrough,
+                        )
+                    with stage("write"):
+                        cache.fetch(key, output)
+                else:
+                    # Outputs may be theme aliases from an earlier run, which must be replaced, not written through.
+                    if os.path.lexists(output):
+                        os.unlink(output)
+                    with open(output, "wb") as f:
+                        try:
+                            write_x11(
+                                frames,
+                                f,
+                                coalesce=coalesce,
+                                resample=resample,
+                                workers=resize_workers,
+                                stream=stream,
+                                passthrough=passthrough,
+                            )
+                        except BaseException:
+                            # Do not leave a truncated file behind.
+                            f.close()
+                            os.unlink(output)
+                            raise
+            except Exception:
+                return Result(name, format_error(), missed)
+            finally:
+                # Parsed frames hold views into the mapping, release them before it is closed.
+                del cursor, frames
+    finally:
+        if isinstance(blob, mmap.mmap):
+            blob.close()
+    return Result(name, cache_hit=missed)
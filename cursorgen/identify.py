@@ -0,0 +1,21 @@
+from cursorgen.parser import ImageInfo, inspect_blob
+from cursorgen.parser.base import Buffer
+
+
+def _describe_image(image: ImageInfo) -> str:
+    kind = f"{image.bpp}bpp png" if image.png else f"{image.bpp}bpp"
+    return f"{image.width}x{image.height} {kind} hotspot {image.hotspot[0]},{image.hotspot[1]}"
+
+
+def identify(blob: Buffer) -> str:
+    """Describes the format of a cursor file and a few of its header fields in one line.
+
+    Only the headers are read through inspect_blob, so no image is decoded and neither PIL nor NumPy are imported.
+    """
+    info = inspect_blob(blob)
+    if info.format == "cur":
+        images = info.frames[0]
+        return f"cur, {len(images)} images: {'; '.join(map(_describe_image, images))}"
+
+    sizes = ",".join(map(str, info.nominal_sizes))
+    return f"{info.format}, {info.frame_count} frames, {info.step_count} steps, {sum(info.delays):g}s, sizes {sizes}"
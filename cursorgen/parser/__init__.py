@@ -1,10 +1,12 @@
 from typing import List, Type
 
 from cursorgen.parser.ani import ANIParser
-from cursorgen.parser.base import BaseParser
+from cursorgen.parser.base import BaseParser, Buffer
 from cursorgen.parser.bmp import BMPParser
 from cursorgen.parser.cur import CURParser
+from cursorgen.parser.info import CursorInfo, ImageInfo, inspect_blob
 from cursorgen.parser.xcursor import XCursorParser
+from cursorgen.utils.stats import count, stage
 
 __all__ = [
     "BMPParser",
@@ -13,13 +15,20 @@ __all__ = [
     "XCursorParser",
     "PARSERS",
     "open_blob",
+    "CursorInfo",
+    "ImageInfo",
+    "inspect_blob",
 ]
 
 PARSERS: List[Type[BaseParser]] = [CURParser, ANIParser, XCursorParser]
 
 
-def open_blob(blob: bytes) -> BaseParser:
+def open_blob(blob: Buffer) -> BaseParser:
+    count("bytes_in", len(blob))
     for parser in PARSERS:
-        if parser.can_parse(blob):
-            return parser(blob)
+        with stage("sniff"):
+            matched = parser.can_parse(blob)
+        if matched:
+            with stage("parse"):
+                return parser(blob)
     raise ValueError("Unsupported file format")
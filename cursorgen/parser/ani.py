@@ -1,10 +1,10 @@
 import struct
-from copy import copy
-from typing import Any, Iterable, List, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
 
-from cursorgen.parser.base import BaseParser
+from cursorgen.parser.base import BaseParser, Buffer
 from cursorgen.parser.cur import CURParser
-from cursorgen.utils.cursor import CursorFrame
+from cursorgen.utils.cursor import CursorFrame, CursorImage
+from cursorgen.utils.limits import check
 
 
 class ANIParser(BaseParser):
@@ -24,30 +24,33 @@ class ANIParser(BaseParser):
     ICON_FLAG = 0x1
 
     @classmethod
-    def can_parse(cls, blob: bytes) -> bool:
+    def can_parse(cls, blob: Buffer) -> bool:
         signature: bytes
         size: int
         subtype: bytes
         try:
-            signature, size, subtype = cls.RIFF_HEADER.unpack(blob[: cls.RIFF_HEADER.size])
+            signature, size, subtype = cls.RIFF_HEADER.unpack_from(blob)
         except struct.error:
             return False
         return signature == cls.SIGNATURE and subtype == cls.ANI_TYPE
 
-    def __init__(self, blob: bytes) -> None:
+    def __init__(self, blob: Buffer) -> None:
         super().__init__(blob)
-        if not self.can_parse(blob):
+        if not self.can_parse(self.blob):
             raise ValueError("Not a .ani file")
-        self.frames = self._parse(self.RIFF_HEADER.size)
+        self._chunk_count = 0
+        self._icons, self._order, self._delays = self._parse(self.RIFF_HEADER.size)
 
     def _unpack(self, struct_cls: struct.Struct, offset: int) -> Tuple[Any, ...]:
-        return struct_cls.unpack(self.blob[offset : offset + struct_cls.size])
+        return struct_cls.unpack_from(self.blob, offset)
 
     def _read_chunk(self, offset: int, expected: Iterable[bytes]) -> Tuple[bytes, int, int]:
         found = []
         while True:
             name, size = self._unpack(self.CHUNK_HEADER, offset)
             offset += self.CHUNK_HEADER.size
+            self._chunk_count += 1
+            check("chunks", self._chunk_count)
             if name in expected:
                 break
             found += [name]
@@ -56,7 +59,8 @@ class ANIParser(BaseParser):
                 raise ValueError(f"Expected chunk {expected!r}, found {found!r}")
         return name, size, offset
 
-    def _parse(self, offset: int) -> List[CursorFrame]:
+    def _parse(self, offset: int) -> Tuple[List[memoryview], List[int], List[int]]:
+        """Reads the headers and the animation sequence, and locates the icon of each frame without parsing it."""
         _, size, offset = self._read_chunk(offset, expected=[self.HEADER_CHUNK])
 
         if size != self.ANIH_HEADER.size:
@@ -72,7 +76,7 @@ class ANIParser(BaseParser):
             planes,
             display_rate,
             flags,
-        ) = self.ANIH_HEADER.unpack(self.blob[offset : offset + self.ANIH_HEADER.size])
+        ) = self._unpack(self.ANIH_HEADER, offset)
 
         if size != self.ANIH_HEADER.size:
             raise ValueError(f"Unexpected size in anih header {size}, expected {self.ANIH_HEADER.size}")
@@ -80,9 +84,12 @@ class ANIParser(BaseParser):
         if not flags & self.ICON_FLAG:
             raise NotImplementedError("Raw BMP images not supported.")
 
+        check("frames", frame_count)
+        check("steps", step_count)
+
         offset += self.ANIH_HEADER.size
 
-        frames = []
+        icons = []
         order = list(range(frame_count))
         delays = [display_rate for _ in range(step_count)]
 
@@ -90,15 +97,14 @@ class ANIParser(BaseParser):
             name, size, offset = self._read_chunk(offset, expected=[self.LIST_CHUNK, self.SEQ_CHUNK, self.RATE_CHUNK])
             if name == self.LIST_CHUNK:
                 list_end = offset + size
-                if self.blob[offset : offset + 4] != self.FRAME_TYPE:
-                    raise ValueError(
-                        f"Unexpected RIFF list type: {self.blob[offset:offset + 4]!r}, expected {self.FRAME_TYPE!r}"
-                    )
+                list_type = bytes(self.blob[offset : offset + 4])
+                if list_type != self.FRAME_TYPE:
+                    raise ValueError(f"Unexpected RIFF list type: {list_type!r}, expected {self.FRAME_TYPE!r}")
                 offset += 4
 
                 for i in range(frame_count):
                     _, size, offset = self._read_chunk(offset, expected=[self.ICON_CHUNK])
-                    frames.append(CURParser(self.blob[offset : offset + size]).frames[0])
+                    icons.append(self.blob[offset : offset + size])
                     offset += size
                     if offset & 1:
                         offset += 1
@@ -119,7 +125,16 @@ class ANIParser(BaseParser):
         if len(order) != step_count:
             raise ValueError('Required chunk "seq " not found.')
 
-        sequence = [copy(frames[i]) for i in order]
-        for frame, delay in zip(sequence, delays):
-            frame.delay = delay / 60
-        return sequence
+        return icons, order, delays
+
+    def iter_frames(self) -> Iterator[CursorFrame]:
+        """Yields each animation step, parsing the icon of a frame when a step first shows it.
+
+        Steps showing the same frame share its images, only the delay is per step.
+        """
+        frames: Dict[int, List[CursorImage]] = {}
+        for index, delay in zip(self._order, self._delays):
+            images = frames.get(index)
+            if images is None:
+                images = frames[index] = CURParser(self._icons[index]).frames[0].images
+            yield CursorFrame(images, delay / 60, delay * 1000 // 60)
@@ -1,18 +1,38 @@
+import mmap
 from abc import ABCMeta, abstractmethod
-from typing import List
+from typing import Iterator, List, Optional, Union
 
 from cursorgen.utils.cursor import CursorFrame
 
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
 
 class BaseParser(metaclass=ABCMeta):
-    blob: bytes
-    frames: List[CursorFrame]
+    blob: memoryview
+    _frames: Optional[List[CursorFrame]] = None
 
     @abstractmethod
-    def __init__(self, blob: bytes) -> None:
-        self.blob = blob
+    def __init__(self, blob: Buffer) -> None:
+        # Parsers slice the memoryview and hand the slices down to nested parsers without copying the data.
+        self.blob = memoryview(blob).cast("B")
 
     @classmethod
     @abstractmethod
-    def can_parse(cls, blob: bytes) -> bool:
+    def can_parse(cls, blob: Buffer) -> bool:
         raise NotImplementedError()
+
+    @property
+    def frames(self) -> List[CursorFrame]:
+        """All frames of the cursor, collected from iter_frames on first access and then kept."""
+        if self._frames is None:
+            self._frames = list(self.iter_frames())
+        return self._frames
+
+    def iter_frames(self) -> Iterator[CursorFrame]:
+        """Yields the frames of the cursor in display order.
+
+        Parsers that need every frame to parse the file yield the frames they keep; others parse each frame as it is
+        reached and keep nothing once the iteration ends.
+        """
+        assert self._frames is not None
+        return iter(self._frames)
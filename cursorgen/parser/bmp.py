@@ -1,10 +1,12 @@
 import struct
-from typing import Any, Dict, List, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
 
-import PIL.Image as ImageType
-from PIL import Image
+from cursorgen.parser.base import BaseParser, Buffer
+from cursorgen.utils.stats import stage
 
-from cursorgen.parser.base import BaseParser
+if TYPE_CHECKING:
+    import numpy as np
+    from PIL import Image
 
 
 class BMPParser(BaseParser):
@@ -17,21 +19,33 @@ class BMPParser(BaseParser):
     DIB_HEADER = struct.Struct("<IIIHHIIIIII")
 
     @classmethod
-    def can_parse(cls, blob: bytes) -> bool:
+    def can_parse(cls, blob: Buffer) -> bool:
         """Check if the blob is one of the supported BMP types."""
         if len(blob) < cls.BMP_HEADER.size:
             return False
         signature: bool = cls.BMP_HEADER.unpack_from(blob)[0]
         return signature
 
-    def __init__(self, blob: bytes) -> None:
+    def __init__(self, blob: Buffer) -> None:
         super().__init__(blob)
         self.image_data: List[bytes] = []
         self.parameters = self._extract()
-        self.frame = self._parse()
+        with stage("decode"):
+            self.pixels = self._parse()
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.parameters["width"], self.parameters["height"]
+
+    @property
+    def frame(self) -> "Image.Image":
+        """The decoded image as a PIL image, created on each access."""
+        from PIL import Image
+
+        return Image.frombytes("RGBA", self.size, self.pixels, "raw", "BGRA")
 
     def _unpack(self, struct_cls: struct.Struct, offset: int) -> Tuple[Any, ...]:
-        return struct_cls.unpack(self.blob[offset : offset + struct_cls.size])
+        return struct_cls.unpack_from(self.blob, offset)
 
     def _extract(self) -> Dict[str, Any]:
         """Gets bitmap parameters.
@@ -58,7 +72,7 @@ class BMPParser(BaseParser):
             y_pixels_per_meter,
             colors_used,
             important_colors,
-        ) = self.DIB_HEADER.unpack(self.blob[: self.DIB_HEADER.size])
+        ) = self._unpack(self.DIB_HEADER, 0)
 
         height = int(height / 2.0)
 
@@ -69,7 +83,7 @@ class BMPParser(BaseParser):
         if palette_size < 0:
             palette_size = 0
 
-        Palette = self.blob[size : size + palette_size]
+        Palette = bytes(self.blob[size : size + palette_size])
         XORData = self.blob[size + palette_size : size + palette_size + XOR_size]
         ANDData = self.blob[size + palette_size + XOR_size : len(self.blob)]
 
@@ -92,11 +106,17 @@ class BMPParser(BaseParser):
         }
         return parameters
 
-    def _parse(self) -> ImageType:
-        """Gets image from bytes."""
+    def _parse(self) -> bytes:
+        """Gets top-down BGRA pixels from bytes."""
+
+        if self.parameters["bpp"] == 32:
+            return self._parse_bgra()
+        if self.parameters["palette"] and self.parameters["bpp"] <= 8:
+            return self._parse_indexed()
+
+        from PIL import Image
 
         modes = {
-            32: ("RGBA", "BGRA"),
             24: ("RGB", "BGR"),
             16: ("RGB", "BGR"),
             8: ("P", "P"),
@@ -113,19 +133,7 @@ class BMPParser(BaseParser):
         if self.parameters["bpp"] == 16:
             # PIL I;16 converted to RGB555 format.
             pad_ima = self._row_size(24, self.parameters["width"])
-            images_data = []
-            for i in range(0, len(self.parameters["xor"]), 2):
-                data = int.from_bytes(self.parameters["xor"][i : i + 2], byteorder="little")
-                b = (data & 0x7C00) >> 10
-                g = (data & 0x3E0) >> 5
-                r = data & 0x1F
-                r = (r << 3) | (r >> 2)
-                g = (g << 3) | (g >> 2)
-                b = (b << 3) | (b >> 2)
-                value = r << 16 | g << 8 | b
-                images_data.append(value.to_bytes(3, byteorder="little"))
-
-            image_data = b"".join(images_data)
+            image_data = self._decode_rgb555(self.parameters["xor"])
             image = Image.frombytes(
                 modes[self.parameters["bpp"]][0],
                 (self.parameters["width"], self.parameters["height"]),
@@ -147,62 +155,99 @@ class BMPParser(BaseParser):
                 -1,
             )
 
-        if self.parameters["bpp"] == 32:
-            mask = Image.frombuffer(
-                "L",
-                (self.parameters["width"], self.parameters["height"]),
-                self.parameters["xor"][3::4],
-                "raw",
-                "L",
-                0,
-                -1,
-            )
-        else:
-            mask = Image.frombuffer(
-                "1",
-                (self.parameters["width"], self.parameters["height"]),
-                self.parameters["and"],
-                "raw",
-                "1;I",
-                pad_msk,
-                -1,
-            )
-
-        if self.parameters["palette"] and self.parameters["bpp"] <= 8:
-            image = image.convert("P")
-            palette_int = [self.parameters["palette"][i : i + 3] for i in range(0, self.parameters["size_pal"], 4)]
-            rsv = [self.parameters["palette"][i + 3 : i + 4] for i in range(0, self.parameters["size_pal"], 4)]
-
-            if (self.parameters["size_pal"] % 3 == 0) and (self.parameters["size_pal"] % 4 == 0):
-                if len(set(rsv)) <= 1:
-                    # palette RGBA.
-                    palette_int = [pal[i] for pal in palette_int for i in reversed(range(3))]
-                    self.parameters["num_pal"] = self.parameters["size_pal"] // 4
-                else:
-                    # palette RGB.
-                    palette_int = [pal for pal in self.parameters["palette"][::-1]]
-                    self.parameters["num_pal"] = self.parameters["size_pal"] // 3
-            else:
-                if self.parameters["size_pal"] % 3 == 0:
-                    # palette RGB.
-                    palette_int = [pal for pal in self.parameters["palette"][::-1]]
-                    self.parameters["num_pal"] = self.parameters["size_pal"] // 3
-                elif self.parameters["size_pal"] % 4 == 0:
-                    # palette RGBA.
-                    palette_int = [pal[i] for pal in palette_int for i in reversed(range(3))]
-                    self.parameters["num_pal"] = self.parameters["size_pal"] // 4
-
-            if self.parameters["bpp"] == 1:
-                pal = list(image.palette.getdata()[1])
-                pal[:3], pal[-3:] = palette_int[:3], palette_int[-3:]
-                palette_int = pal
-            # Assign palette.
-            image.putpalette(palette_int)
+        mask = Image.frombuffer(
+            "1",
+            (self.parameters["width"], self.parameters["height"]),
+            self.parameters["and"],
+            "raw",
+            "1;I",
+            pad_msk,
+            -1,
+        )
 
         image = image.convert("RGBA")
         image.putalpha(mask)
 
-        return image
+        return image.tobytes("raw", "BGRA")
+
+    def _parse_bgra(self) -> bytes:
+        """Gets pixels from 32bpp BGRA bytes, which only need their rows flipped."""
+        import numpy as np
+
+        width, height = self.parameters["width"], self.parameters["height"]
+        xor = np.frombuffer(self.parameters["xor"], dtype=np.uint8)
+        if xor.size < width * height * 4:
+            raise ValueError("not enough image data")
+        bgra = xor[: width * height * 4].reshape(height, width, 4)[::-1]
+        if bgra[..., 3].any():
+            return bgra.tobytes()
+
+        # Legacy cursors leave alpha zero and carry transparency in the AND mask instead.
+        bgra = bgra.copy()
+        bgra[..., 3] = self._mask_alpha()
+        return bgra.tobytes()
+
+    def _parse_indexed(self) -> bytes:
+        """Gets pixels from 1/2/4/8bpp palette indices, looking up whole BGRA pixels in a 256-entry table."""
+        import numpy as np
+
+        width, height, bpp = self.parameters["width"], self.parameters["height"], self.parameters["bpp"]
+        stride = self._row_size(bpp, width)
+        xor = np.frombuffer(self.parameters["xor"], dtype=np.uint8)
+        if xor.size < stride * height:
+            raise ValueError("not enough image data")
+        rows = xor[: stride * height].reshape(height, stride)[::-1]
+
+        # Pixels are packed most significant bits first.
+        if bpp == 8:
+            indices = rows
+        elif bpp == 1:
+            indices = np.unpackbits(rows, axis=1)
+        elif bpp == 4:
+            indices = np.empty((height, stride * 2), dtype=np.uint8)
+            indices[:, 0::2] = rows >> 4
+            indices[:, 1::2] = rows & 0x0F
+        else:
+            shifts = np.arange(8 - bpp, -1, -bpp, dtype=np.uint8)
+            indices = ((rows[..., None] >> shifts) & ((1 << bpp) - 1)).reshape(height, -1)
+
+        # Opaque BGRA pixels packed little-endian; indices past the end of the palette are black.
+        palette = self._read_palette()[:256].astype("<u4")
+        lut = np.full(256, 0xFF000000, dtype="<u4")
+        lut[: len(palette)] |= palette[:, 2] | (palette[:, 1] << 8) | (palette[:, 0] << 16)
+
+        pixels = lut.take(indices[:, :width])
+        pixels &= (self._mask_alpha().astype("<u4") << 24) | 0x00FFFFFF
+        return pixels.tobytes()
+
+    def _read_palette(self) -> "np.typing.NDArray[np.uint8]":
+        """Gets palette entries as RGB rows, from either BGRX quads or BGR triplets."""
+        import numpy as np
+
+        palette = np.frombuffer(self.parameters["palette"], dtype=np.uint8)
+        size = palette.size
+        # A size that fits both layouts is read as quads if their reserved bytes are all equal.
+        if size % 4 == 0 and (size % 3 != 0 or (palette[3::4] == palette[3:4]).all()):
+            entries = palette.reshape(-1, 4)[:, 2::-1]
+        elif size % 3 == 0:
+            # Only the bytes of each entry are reversed, entries keep their order.
+            entries = palette.reshape(-1, 3)[:, ::-1]
+        else:
+            entries = palette[: size - size % 4].reshape(-1, 4)[:, 2::-1]
+        self.parameters["num_pal"] = len(entries)
+        return entries
+
+    def _mask_alpha(self) -> "np.typing.NDArray[np.uint8]":
+        """Gets top-down alpha from the AND mask, opaque where the mask bit is clear."""
+        import numpy as np
+
+        width, height = self.parameters["width"], self.parameters["height"]
+        pad_msk = self._mask_size(width)
+        mask = np.frombuffer(self.parameters["and"], dtype=np.uint8)
+        if mask.size < pad_msk * height:
+            return np.full((height, width), 0xFF, dtype=np.uint8)
+        bits = np.unpackbits(mask[: pad_msk * height].reshape(height, pad_msk), axis=1)[::-1, :width]
+        return ((bits ^ 1) * 0xFF).astype(np.uint8)
 
     @staticmethod
     def _row_size(offset: int, width: int) -> int:
@@ -216,14 +261,25 @@ class BMPParser(BaseParser):
         return int((width + 32 - width % 32 if (width % 32) > 0 else width) / 8)
 
     @staticmethod
-    def is_png(blob: bytes) -> bool:
+    def _decode_rgb555(data: Buffer) -> bytes:
+        """Expands little-endian RGB555 words to 24-bit triplets, 5-bit channels widened to 8 bits."""
+        import numpy as np
+
+        if len(data) % 2:
+            data = bytes(data) + b"\0"
+        words = np.frombuffer(data, dtype="<u2")
+        triplets = np.empty((words.size, 3), dtype=np.uint8)
+        for i, shift in enumerate((10, 5, 0)):
+            channel = (words >> shift) & 0x1F
+            triplets[:, i] = (channel << 3) | (channel >> 2)
+        return triplets.tobytes()
+
+    @staticmethod
+    def is_png(blob: Buffer) -> bool:
         """Determines whether a sequence of bytes is a PNG."""
-        return blob.startswith(b"\x89PNG\r\n\x1a\n")
+        return bytes(blob[:8]) == b"\x89PNG\r\n\x1a\n"
 
     def is_gray(self) -> bool:
         """Determines whether an image is grayscale (from palette)."""
-        chunks = [self.parameters["palette"][i : i + 3] for i in range(0, self.parameters["size_pal"], 4)]
-        if all(elem == block[0] for block in chunks for elem in block):
-            return True
-        else:
-            return False
+        entries = self._read_palette()
+        return bool((entries == entries[:, :1]).all())
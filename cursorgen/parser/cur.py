@@ -1,11 +1,13 @@
+import io
 import struct
+from functools import partial
 from typing import List, Tuple
 
-from PIL import Image
-
-from cursorgen.parser.base import BaseParser
+from cursorgen.parser.base import BaseParser, Buffer
 from cursorgen.parser.bmp import BMPParser
 from cursorgen.utils.cursor import CursorFrame, CursorImage
+from cursorgen.utils.limits import charge_pixels, check
+from cursorgen.utils.stats import stage
 
 
 class CURParser(BaseParser):
@@ -13,21 +15,28 @@ class CURParser(BaseParser):
     ICO_TYPE_CUR = 2
     ICON_DIR = struct.Struct("<HHH")
     ICON_DIR_ENTRY = struct.Struct("<BBBBHHII")
+    # PNG signature followed by the IHDR chunk length, type, width and height.
+    PNG_HEADER = struct.Struct(">8sI4sII")
+    # IHDR bit depth and color type, following the fields of PNG_HEADER.
+    PNG_FORMAT = struct.Struct(">BB")
+    # Samples per pixel of each PNG color type.
+    PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
 
     @classmethod
-    def can_parse(cls, blob: bytes) -> bool:
+    def can_parse(cls, blob: Buffer) -> bool:
         return blob[: len(cls.MAGIC)] == cls.MAGIC
 
-    def __init__(self, blob: bytes) -> None:
+    def __init__(self, blob: Buffer) -> None:
         super().__init__(blob)
-        self.image_data: List[bytes] = []
+        self.image_data: List[memoryview] = []
         self._hotspots = self._parse()
-        self.frames = self._create_frames()
+        self._frames = self._create_frames()
 
     def _parse(self) -> List[Tuple[int, int]]:
-        reserved, ico_type, image_count = self.ICON_DIR.unpack(self.blob[: self.ICON_DIR.size])
+        reserved, ico_type, image_count = self.ICON_DIR.unpack_from(self.blob)
         assert reserved == 0
         assert ico_type == self.ICO_TYPE_CUR
+        check("chunks", image_count)
 
         offset = self.ICON_DIR.size
         hotspots = []
@@ -41,7 +50,7 @@ class CURParser(BaseParser):
                 hy,
                 size,
                 file_offset,
-            ) = self.ICON_DIR_ENTRY.unpack(self.blob[offset : offset + self.ICON_DIR_ENTRY.size])
+            ) = self.ICON_DIR_ENTRY.unpack_from(self.blob, offset)
             self.image_data.append(self.blob[file_offset : file_offset + size])
             hotspots.append((hx, hy))
 
@@ -49,13 +58,51 @@ class CURParser(BaseParser):
         return hotspots
 
     def _create_frames(self) -> List[CursorFrame]:
+        # Entries are only decoded when their pixels are first needed, so decoding errors surface from the writer.
         images = []
         for hotspot, image_data in zip(self._hotspots, self.image_data):
-            try:
-                image: Image.Image = BMPParser(image_data).frame
-                c_image = CursorImage(image, hotspot, image.width)
-                images.append(c_image)
-            except IOError as e:
-                print(f"Error processing image data: {e}")
-
+            if BMPParser.is_png(image_data):
+                images.append(self._png_image(image_data, hotspot))
+            else:
+                images.append(self._bmp_image(image_data, hotspot))
         return [CursorFrame(images)]
+
+    def _bmp_image(self, image_data: memoryview, hotspot: Tuple[int, int]) -> CursorImage:
+        """Reads the size of a BMP entry from its DIB header; the bitmap is decoded when its pixels are first needed."""
+        if len(image_data) < BMPParser.DIB_HEADER.size:
+            raise ValueError("Truncated BMP image")
+        _, width, height, _, bpp, *_ = BMPParser.DIB_HEADER.unpack_from(image_data)
+        # The DIB height covers both the XOR and the AND mask.
+        size = (width, height // 2)
+        charge_pixels(*size)
+        return CursorImage(partial(self._decode_bmp, image_data), hotspot, width, size, depth=bpp)
+
+    @staticmethod
+    def _decode_bmp(image_data: memoryview) -> bytes:
+        return BMPParser(image_data).pixels
+
+    def _png_image(self, image_data: memoryview, hotspot: Tuple[int, int]) -> CursorImage:
+        """Reads the size of a PNG entry from its IHDR chunk; the PNG is decoded when its pixels are first needed."""
+        if len(image_data) < self.PNG_HEADER.size + self.PNG_FORMAT.size:
+            raise ValueError("Truncated PNG image")
+        _, _, chunk_type, width, height = self.PNG_HEADER.unpack_from(image_data)
+        if chunk_type != b"IHDR":
+            raise ValueError(f"Unexpected first PNG chunk {chunk_type!r}, expected b'IHDR'")
+        depth, color_type = self.PNG_FORMAT.unpack_from(image_data, self.PNG_HEADER.size)
+        charge_pixels(width, height)
+        return CursorImage(
+            partial(self._decode_png, image_data, (width, height)),
+            hotspot,
+            width,
+            (width, height),
+            depth=depth * self.PNG_CHANNELS.get(color_type, 1),
+        )
+
+    @staticmethod
+    def _decode_png(image_data: memoryview, size: Tuple[int, int]) -> bytes:
+        from PIL import Image
+
+        with stage("decode"), Image.open(io.BytesIO(image_data)) as image:
+            if image.size != size:
+                raise ValueError(f"PNG size {image.size} does not match its header {size}")
+            return image.convert("RGBA").tobytes("raw", "BGRA")
@@ -0,0 +1,149 @@
+import struct
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Tuple
+
+from cursorgen.parser.ani import ANIParser
+from cursorgen.parser.base import Buffer
+from cursorgen.parser.bmp import BMPParser
+from cursorgen.parser.cur import CURParser
+from cursorgen.parser.xcursor import XCursorParser
+
+
+class ImageInfo(NamedTuple):
+    width: int
+    height: int
+    nominal: int
+    hotspot: Tuple[int, int]
+    bpp: int
+    png: bool = False
+
+
+class CursorInfo(NamedTuple):
+    """Metadata of a cursor file, read from its headers without decoding any pixels.
+
+    `frames` holds the images of each distinct frame; an animation shows frames[sequence[i]] for delays[i] seconds
+    at each step. Files that are not animated have a single frame and step.
+    """
+
+    format: str
+    frames: Tuple[Tuple[ImageInfo, ...], ...]
+    sequence: Tuple[int, ...]
+    delays: Tuple[float, ...]
+
+    @property
+    def frame_count(self) -> int:
+        return len(self.frames)
+
+    @property
+    def step_count(self) -> int:
+        return len(self.sequence)
+
+    @property
+    def nominal_sizes(self) -> List[int]:
+        return sorted({image.nominal for frame in self.frames for image in frame})
+
+
+def _inspect_cur_images(blob: memoryview) -> Tuple[ImageInfo, ...]:
+    reserved, ico_type, image_count = CURParser.ICON_DIR.unpack_from(blob)
+    if reserved != 0 or ico_type != CURParser.ICO_TYPE_CUR:
+        raise ValueError("Not a .cur file")
+
+    images = []
+    offset = CURParser.ICON_DIR.size
+    for _ in range(image_count):
+        _, _, _, _, hx, hy, size, file_offset = CURParser.ICON_DIR_ENTRY.unpack_from(blob, offset)
+        offset += CURParser.ICON_DIR_ENTRY.size
+        data = blob[file_offset : file_offset + size]
+        if BMPParser.is_png(data):
+            _, _, _, width, height = CURParser.PNG_HEADER.unpack_from(data)
+            depth, color_type = CURParser.PNG_FORMAT.unpack_from(data, CURParser.PNG_HEADER.size)
+            bpp = depth * CURParser.PNG_CHANNELS.get(color_type, 1)
+            images.append(ImageInfo(width, height, width, (hx, hy), bpp, True))
+        else:
+            _, width, height, _, bpp, *_ = BMPParser.DIB_HEADER.unpack_from(data)
+            # The DIB height covers both the XOR and the AND mask.
+            images.append(ImageInfo(width, height // 2, width, (hx, hy), bpp))
+    return tuple(images)
+
+
+def _inspect_cur(blob: memoryview) -> CursorInfo:
+    return CursorInfo("cur", (_inspect_cur_images(blob),), (0,), (0.0,))
+
+
+def _inspect_ani(blob: memoryview) -> CursorInfo:
+    frames: List[Tuple[ImageInfo, ...]] = []
+    anih = None
+    order: List[int] = []
+    rates: List[int] = []
+
+    offset = ANIParser.RIFF_HEADER.size
+    while offset < len(blob):
+        name, size = ANIParser.CHUNK_HEADER.unpack_from(blob, offset)
+        offset += ANIParser.CHUNK_HEADER.size
+        if name == ANIParser.HEADER_CHUNK:
+            if size != ANIParser.ANIH_HEADER.size:
+                raise ValueError(f"Unexpected anih header size {size}, expected {ANIParser.ANIH_HEADER.size}")
+            anih = ANIParser.ANIH_HEADER.unpack_from(blob, offset)
+        elif name == ANIParser.LIST_CHUNK and bytes(blob[offset : offset + 4]) == ANIParser.FRAME_TYPE:
+            position, end = offset + 4, offset + size
+            while position < end:
+                chunk, icon_size = ANIParser.CHUNK_HEADER.unpack_from(blob, position)
+                position += ANIParser.CHUNK_HEADER.size
+                if chunk == ANIParser.ICON_CHUNK:
+                    frames.append(_inspect_cur_images(blob[position : position + icon_size]))
+                position += icon_size + (icon_size & 1)
+        elif name == ANIParser.SEQ_CHUNK:
+            order = [i for i, in ANIParser.UNSIGNED.iter_unpack(blob[offset : offset + size])]
+        elif name == ANIParser.RATE_CHUNK:
+            rates = [i for i, in ANIParser.UNSIGNED.iter_unpack(blob[offset : offset + size])]
+        offset += size
+
+    if anih is None:
+        raise ValueError(f"Required chunk {ANIParser.HEADER_CHUNK!r} not found")
+    _, frame_count, step_count, _, _, _, _, display_rate, _ = anih
+    if len(frames) != frame_count:
+        raise ValueError(f"Wrong number of frames: {len(frames)}, expected {frame_count}")
+
+    sequence = order or list(range(frame_count))
+    delays = rates or [display_rate] * len(sequence)
+    if len(sequence) != step_count or len(delays) != step_count:
+        raise ValueError(f"Wrong animation sequence size, expected {step_count} steps")
+    return CursorInfo("ani", tuple(frames), tuple(sequence), tuple(delay / 60 for delay in delays))
+
+
+def _inspect_xcursor(blob: memoryview) -> CursorInfo:
+    _, _, version, toc_size = XCursorParser.FILE_HEADER.unpack_from(blob)
+    if version != XCursorParser.VERSION:
+        raise ValueError(f"Unsupported Xcursor version 0x{version:08x}")
+
+    images_by_size: Dict[int, List[Tuple[ImageInfo, float]]] = defaultdict(list)
+    for i in range(toc_size):
+        chunk_type, _, position = XCursorParser.TOC_CHUNK.unpack_from(
+            blob, XCursorParser.FILE_HEADER.size + i * XCursorParser.TOC_CHUNK.size
+        )
+        if chunk_type != XCursorParser.CHUNK_IMAGE:
+            continue
+        _, _, nominal, _, width, height, hx, hy, delay = XCursorParser.IMAGE_HEADER.unpack_from(blob, position)
+        images_by_size[nominal].append((ImageInfo(width, height, nominal, (hx, hy), 32), delay / 1000))
+
+    if len(set(map(len, images_by_size.values()))) > 1:
+        raise ValueError("cursorgen does not support animations where each size has different number of frames")
+
+    steps = list(zip(*images_by_size.values()))
+    frames = tuple(tuple(image for image, _ in step) for step in steps)
+    return CursorInfo("xcursor", frames, tuple(range(len(frames))), tuple(step[0][1] for step in steps))
+
+
+def inspect_blob(blob: Buffer) -> CursorInfo:
+    """Reads the metadata of a cursor file from its headers, without decoding any images."""
+    blob = memoryview(blob).cast("B")
+    try:
+        if CURParser.can_parse(blob):
+            return _inspect_cur(blob)
+        if ANIParser.can_parse(blob):
+            return _inspect_ani(blob)
+        if XCursorParser.can_parse(blob):
+            return _inspect_xcursor(blob)
+    except struct.error as e:
+        raise ValueError(f"Truncated header: {e}")
+    raise ValueError("Unsupported file format")
@@ -2,10 +2,9 @@ import struct
 from collections import defaultdict
 from typing import Any, Dict, List, Tuple, cast
 
-from PIL import Image
-
-from cursorgen.parser.base import BaseParser
+from cursorgen.parser.base import BaseParser, Buffer
 from cursorgen.utils.cursor import CursorFrame, CursorImage
+from cursorgen.utils.limits import charge_pixels, check
 
 
 class XCursorParser(BaseParser):
@@ -17,15 +16,16 @@ class XCursorParser(BaseParser):
     IMAGE_HEADER = struct.Struct("<IIIIIIIII")
 
     @classmethod
-    def can_parse(cls, blob: bytes) -> bool:
+    def can_parse(cls, blob: Buffer) -> bool:
         return blob[: len(cls.MAGIC)] == cls.MAGIC
 
-    def __init__(self, blob: bytes) -> None:
+    def __init__(self, blob: Buffer) -> None:
+        """Parses the TOC and image headers; images reference their pixel data in the blob without copying it."""
         super().__init__(blob)
-        self.frames = self._parse()
+        self._frames = self._parse()
 
     def _unpack(self, struct_cls: struct.Struct, offset: int) -> Tuple[Any, ...]:
-        return struct_cls.unpack(self.blob[offset : offset + struct_cls.size])
+        return struct_cls.unpack_from(self.blob, offset)
 
     def _parse(self) -> List[CursorFrame]:
         magic, header_size, version, toc_size = self._unpack(self.FILE_HEADER, 0)
@@ -34,6 +34,7 @@ class XCursorParser(BaseParser):
         if version != self.VERSION:
             raise ValueError(f"Unsupported Xcursor version 0x{version:08x}")
 
+        check("chunks", toc_size)
         offset = self.FILE_HEADER.size
         chunks: List[Tuple[int, int, int]] = []
         for i in range(toc_size):
@@ -42,10 +43,15 @@ class XCursorParser(BaseParser):
             offset += self.TOC_CHUNK.size
 
         images_by_size: Dict[int, List[Tuple[CursorImage, int]]] = defaultdict(list)
+        # TOC entries sharing a chunk share its image.
+        images_by_position: Dict[int, Tuple[CursorImage, int]] = {}
 
         for chunk_type, chunk_subtype, position in chunks:
             if chunk_type != self.CHUNK_IMAGE:
                 continue
+            if position in images_by_position and images_by_position[position][0].nominal == chunk_subtype:
+                images_by_size[chunk_subtype].append(images_by_position[position])
+                continue
 
             (
                 size,
@@ -58,7 +64,6 @@ class XCursorParser(BaseParser):
                 y_offset,
                 delay,
             ) = self._unpack(self.IMAGE_HEADER, position)
-            delay /= 1000
 
             if size != self.IMAGE_HEADER.size:
                 raise ValueError(f"Unexpected size: {size}, expected {self.IMAGE_HEADER.size}")
@@ -81,17 +86,26 @@ class XCursorParser(BaseParser):
             if y_offset > height:
                 raise ValueError(f"Hotspot x-coordinate too large: {y_offset}")
 
+            charge_pixels(width, height)
             image_start = position + self.IMAGE_HEADER.size
             image_size = width * height * 4
-            blob = self.blob[image_start : image_start + image_size]
-            if len(blob) != image_size:
-                raise ValueError(f"Invalid image at {image_start}: expected {image_size} bytes, got {len(blob)} bytes")
+            available = max(0, min(image_size, len(self.blob) - image_start))
+            if available != image_size:
+                raise ValueError(f"Invalid image at {image_start}: expected {image_size} bytes, got {available} bytes")
 
-            image = Image.frombytes("RGBA", (width, height), blob, "raw", "BGRA")
-            images_by_size[nominal_size].append((CursorImage(image, (x_offset, y_offset), nominal_size), delay))
+            image = CursorImage(
+                self.blob[image_start : image_start + image_size],
+                (x_offset, y_offset),
+                nominal_size,
+                (width, height),
+                self.blob[position : image_start + image_size],
+            )
+            images_by_position[position] = (image, delay)
+            images_by_size[nominal_size].append((image, delay))
 
         if len(set(map(len, images_by_size.values()))) != 1:
             raise ValueError("cursorgen does not support animations where each size has different number of frames")
+        check("frames", len(next(iter(images_by_size.values()))))
 
         result = []
         for sequence in cast(Any, zip(*images_by_size.values())):
@@ -102,6 +116,6 @@ class XCursorParser(BaseParser):
             if len(set(delays)) != 1:
                 raise ValueError("cursorgen does not support animations where each size has a different frame delay")
 
-            result.append(CursorFrame(list(images), delays[0]))
+            result.append(CursorFrame(list(images), delays[0] / 1000, delays[0]))
 
         return result
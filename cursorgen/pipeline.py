@@ -0,0 +1,258 @@
+import asyncio
+import os
+import time
+import traceback
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+from cursorgen.convert import Result, format_error, import_decoders
+from cursorgen.parser import open_blob
+from cursorgen.utils.cache import ConversionCache
+from cursorgen.utils.limits import Limits, enforce
+from cursorgen.utils.stats import Stats, collect
+from cursorgen.writer import to_x11, x11
+
+T = TypeVar("T")
+
+
+class ByteBudget:
+    """Limits the number of bytes held by the pipeline.
+
+    Only the read stage waits for budget; later stages charge their output without waiting, so data that is already
+    in flight can always drain. A single item larger than the limit is admitted once the pipeline is empty.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.used = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, size: int) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.used == 0 or self.used + size <= self.limit)
+            self.used += size
+
+    async def charge(self, size: int) -> None:
+        async with self._condition:
+            self.used += size
+
+    async def release(self, size: int) -> None:
+        async with self._condition:
+            self.used -= size
+            self._condition.notify_all()
+
+
+class _Item:
+    __slots__ = ("name", "output", "data", "key", "stats")
+
+    def __init__(self, name: str, output: str, data: bytes, key: Optional[str], stats: Optional[Stats]) -> None:
+        self.name = name
+        self.output = output
+        self.data = data
+        self.key = key
+        self.stats = stats
+
+
+def _read(name: str) -> bytes:
+    with open(name, "rb") as f:
+        return f.read()
+
+
+def _encode(
+    blob: bytes,
+    coalesce: bool,
+    resample: str,
+    resize_workers: int,
+    stream: bool,
+    passthrough: bool,
+    limits: Limits,
+    stats: Optional[Stats],
+) -> Tuple[bytes, Optional[Stats]]:
+    import_decoders()
+    if stats is None:
+        return _to_x11(blob, coalesce, resample, resize_workers, stream, passthrough, limits), None
+    with collect(stats, trace_memory=False):
+        return _to_x11(blob, coalesce, resample, resize_workers, stream, passthrough, limits), stats
+
+
+def _to_x11(
+    blob: bytes, coalesce: bool, resample: str, resize_workers: int, stream: bool, passthrough: bool, limits: Limits
+) -> bytes:
+    with enforce(limits):
+        frames = open_blob(blob).iter_frames()
+        return to_x11(
+            frames,
+            coalesce=coalesce,
+            resample=resample,
+            workers=resize_workers,
+            stream=stream,
+            passthrough=passthrough,
+        )
+
+
+def _write(output: str, data: bytes, cache: Optional[ConversionCache], key: Optional[str]) -> None:
+    if cache is not None and key is not None:
+        with cache.store(key) as f:
+            f.write(data)
+        cache.fetch(key, output)
+    else:
+        # Outputs may be theme aliases written by an earlier run, which must be replaced, not written through.
+        if os.path.lexists(output):
+            os.unlink(output)
+        with open(output, "wb") as f:
+            f.write(data)
+
+
+async def _timed(stats: Optional[Stats], name: str, future: "asyncio.Future[T]") -> T:
+    start = time.perf_counter()
+    try:
+        return await future
+    finally:
+        if stats is not None:
+            elapsed = time.perf_counter() - start
+            stats.stages[name] += elapsed
+            stats.wall += elapsed
+
+
+async def _run(
+    jobs: List[Tuple[str, str]],
+    executor: Executor,
+    workers: int,
+    on_result: Callable[[Result], None],
+    max_inflight: int,
+    cache_dir: Optional[str],
+    stats: bool,
+    coalesce: bool,
+    resample: str,
+    resize_workers: int,
+    stream: bool,
+    passthrough: bool,
+    limits: Limits,
+) -> None:
+    loop = asyncio.get_running_loop()
+    budget = ByteBudget(max_inflight)
+    cache = ConversionCache(cache_dir, 0) if cache_dir is not None else None
+    missed = None if cache is None else False
+    decoded: "asyncio.Queue[Optional[_Item]]" = asyncio.Queue(workers)
+    encoded: "asyncio.Queue[Optional[_Item]]" = asyncio.Queue(workers)
+
+    with ThreadPoolExecutor(max(2, workers // 2), thread_name_prefix="cursorgen-io") as io:
+
+        async def read() -> None:
+            for name, output in jobs:
+                file_stats = Stats(name) if stats else None
+                try:
+                    size = os.stat(name).st_size
+                except OSError:
+                    on_result(Result(name, traceback.format_exc()))
+                    continue
+
+                await budget.acquire(size)
+                try:
+                    blob = await _timed(file_stats, "read", loop.run_in_executor(io, _read, name))
+                    key = None
+                    if cache is not None:
+                        key = cache.key(
+                            blob, x11.VERSION, x11.SIZES, coalesce=coalesce, resample=resample, passthrough=passthrough
+                        )
+                        if await _timed(file_stats, "write", loop.run_in_executor(io, cache.fetch, key, output)):
+                            on_result(Result(name, cache_hit=True, stats=file_stats))
+                            await budget.release(size)
+                            continue
+                except Exception:
+                    on_result(Result(name, traceback.format_exc(), stats=file_stats))
+                    await budget.release(size)
+                    continue
+                await decoded.put(_Item(name, output, blob, key, file_stats))
+
+            for _ in range(workers):
+                await decoded.put(None)
+
+        async def convert() -> None:
+            while True:
+                item = await decoded.get()
+                if item is None:
+                    break
+
+                size = len(item.data)
+                try:
+                    data, item.stats = await loop.run_in_executor(
+                        executor,
+                        _encode,
+                        item.data,
+                        coalesce,
+                        resample,
+                        resize_workers,
+                        stream,
+                        passthrough,
+                        limits,
+                        item.stats,
+                    )
+                except Exception:
+                    on_result(Result(item.name, format_error(), missed, item.stats))
+                    await budget.release(size)
+                    continue
+
+                item.data = data
+                await budget.charge(len(data))
+                await budget.release(size)
+                await encoded.put(item)
+            await encoded.put(None)
+
+        async def write() -> None:
+            remaining = workers
+            while remaining:
+                item = await encoded.get()
+                if item is None:
+                    remaining -= 1
+                    continue
+
+                try:
+                    future = loop.run_in_executor(io, _write, item.output, item.data, cache, item.key)
+                    await _timed(item.stats, "write", future)
+                except Exception:
+                    on_result(Result(item.name, traceback.format_exc(), missed, item.stats))
+                else:
+                    on_result(Result(item.name, cache_hit=missed, stats=item.stats))
+                finally:
+                    await budget.release(len(item.data))
+
+        await asyncio.gather(read(), write(), *(convert() for _ in range(workers)))
+
+
+def run_pipeline(
+    jobs: List[Tuple[str, str]],
+    executor: Executor,
+    workers: int,
+    on_result: Callable[[Result], None],
+    max_inflight: int,
+    cache_dir: Optional[str] = None,
+    stats: bool = False,
+    coalesce: bool = False,
+    resample: str = "nearest",
+    resize_workers: int = 1,
+    stream: bool = False,
+    passthrough: bool = False,
+    limits: Optional[Limits] = None,
+) -> None:
+    """Converts (input, output) jobs with read, convert and write stages, holding at most max_inflight bytes.
+
+    Whole files are passed to executor, so it should be a thread pool rather than pickle them to processes.
+    """
+    asyncio.run(
+        _run(
+            jobs,
+            executor,
+            workers,
+            on_result,
+            max_inflight,
+            cache_dir,
+            stats,
+            coalesce,
+            resample,
+            resize_workers,
+            stream,
+            passthrough,
+            limits or Limits(),
+        )
+    )
@@ -0,0 +1,247 @@
+import asyncio
+import json
+import os
+import signal
+import stat
+import sys
+import time
+import traceback
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, Optional, Set
+
+from cursorgen.convert import convert
+from cursorgen.utils.cache import ConversionCache
+from cursorgen.utils.limits import Limits
+from cursorgen.writer.x11 import RESAMPLE
+
+# Request keys passed on to convert, with the type each value must have.
+OPTIONS = {
+    "mmap": bool,
+    "cache_dir": str,
+    "stats": bool,
+    "coalesce": bool,
+    "resample": str,
+    "resize_workers": int,
+    "stream": bool,
+    "passthrough": bool,
+}
+
+# Longest request line accepted, in bytes.
+MAX_REQUEST = 1 << 20
+
+
+class RequestError(ValueError):
+    pass
+
+
+async def _read_request(reader: asyncio.StreamReader) -> bytes:
+    """Reads a request line, or b"" at EOF. Lines over MAX_REQUEST bytes are skipped with RequestError."""
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as e:
+        return e.partial
+    except asyncio.LimitOverrunError:
+        pass
+
+    while True:
+        try:
+            await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError:
+            pass
+        except asyncio.LimitOverrunError as e:
+            await reader.readexactly(e.consumed)
+            continue
+        raise RequestError(f"Request longer than {MAX_REQUEST} bytes")
+
+
+def _read_request_file(file: BinaryIO) -> bytes:
+    """Like _read_request, for files that cannot be read through a pipe transport."""
+    line = file.readline(MAX_REQUEST + 1)
+    if len(line) <= MAX_REQUEST or line.endswith(b"\n"):
+        return line
+    while line and not line.endswith(b"\n"):
+        line = file.readline(MAX_REQUEST)
+    raise RequestError(f"Request longer than {MAX_REQUEST} bytes")
+
+
+def _parse_request(line: bytes) -> Dict[str, Any]:
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        raise RequestError(f"Invalid JSON: {e}")
+    if not isinstance(request, dict):
+        raise RequestError("Request must be a JSON object")
+    return request
+
+
+def _convert_options(request: Dict[str, Any]) -> Dict[str, Any]:
+    for name in ("input", "output"):
+        if not isinstance(request.get(name), str):
+            raise RequestError(f"{name!r} must be a path")
+
+    options: Dict[str, Any] = {}
+    for name, value in request.items():
+        if name in ("id", "input", "output"):
+            continue
+        expected = OPTIONS.get(name)
+        if expected is None:
+            raise RequestError(f"Unknown option {name!r}")
+        if not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+            raise RequestError(f"{name!r} must be of type {expected.__name__}")
+        # The request key matches the command line's --mmap.
+        options["use_mmap" if name == "mmap" else name] = value
+
+    if options.get("resample", "nearest") not in RESAMPLE:
+        raise RequestError(f"'resample' must be one of {', '.join(RESAMPLE)}")
+    if options.get("resize_workers", 1) < 1:
+        raise RequestError("'resize_workers' must be at least 1")
+    return options
+
+
+class Server:
+    """Converts cursor files on newline-delimited JSON requests (see the README), reusing one worker pool."""
+
+    def __init__(self, executor: Executor, cache_size: int, limits: Optional[Limits] = None) -> None:
+        self.executor = executor
+        self.cache_size = cache_size
+        self.limits = limits or Limits()
+        self.cache_dirs: Set[str] = set()
+
+    async def respond(self, line: bytes) -> Dict[str, Any]:
+        request: Dict[str, Any] = {}
+        try:
+            request = _parse_request(line)
+            options = _convert_options(request)
+        except RequestError as e:
+            return {"id": request.get("id"), "ok": False, "error": str(e)}
+
+        name, output = request["input"], request["output"]
+        if os.path.isdir(output):
+            output = os.path.join(output, os.path.splitext(os.path.basename(name))[0])
+        if "cache_dir" in options:
+            self.cache_dirs.add(options["cache_dir"])
+
+        response: Dict[str, Any] = {"id": request.get("id"), "input": name, "output": output}
+        start = time.perf_counter()
+        try:
+            future = asyncio.get_running_loop().run_in_executor(
+                self.executor, partial(convert, name, output, limits=self.limits, **options)
+            )
+            result = await future
+        except Exception:
+            response.update(ok=False, error=traceback.format_exc(), cache_hit=None)
+        else:
+            response.update(ok=result.error is None, error=result.error, cache_hit=result.cache_hit)
+            if result.stats is not None:
+                response["stats"] = result.stats.to_dict()
+        response["time"] = time.perf_counter() - start
+        return response
+
+    async def handle(self, readline: Callable[[], Awaitable[bytes]], write: Callable[[bytes], Awaitable[None]]) -> None:
+        """Answers every request line read until EOF."""
+        tasks: Set["asyncio.Task[None]"] = set()
+
+        async def answer(line: bytes) -> None:
+            response = await self.respond(line)
+            await write(json.dumps(response).encode() + b"\n")
+
+        while True:
+            try:
+                line = await readline()
+            except RequestError as e:
+                await write(json.dumps({"id": None, "ok": False, "error": str(e)}).encode() + b"\n")
+                continue
+            if not line:
+                break
+            if not line.strip():
+                continue
+            task = asyncio.create_task(answer(line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    def prune(self) -> None:
+        for cache_dir in self.cache_dirs:
+            ConversionCache(cache_dir, self.cache_size).prune()
+
+
+class Writer:
+    """Serializes writes of whole response lines to a stream."""
+
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        self.writer = writer
+        self._lock = asyncio.Lock()
+
+    async def __call__(self, data: bytes) -> None:
+        async with self._lock:
+            self.writer.write(data)
+            await self.writer.drain()
+
+
+async def _serve_stdio(server: Server) -> None:
+    loop = asyncio.get_running_loop()
+    readline: Callable[[], Awaitable[bytes]]
+    mode = os.fstat(sys.stdin.fileno()).st_mode
+    if stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode) or stat.S_ISCHR(mode):
+        reader = asyncio.StreamReader(limit=MAX_REQUEST)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        readline = partial(_read_request, reader)
+    else:
+        # Files redirected to stdin cannot be read through a pipe transport, read them on a thread instead.
+        readline = partial(loop.run_in_executor, None, _read_request_file, sys.stdin.buffer)
+
+    async def write(data: bytes) -> None:
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+
+    await server.handle(readline, write)
+
+
+async def _serve_unix(server: Server, path: str) -> None:
+    async def connected(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await server.handle(partial(_read_request, reader), Writer(writer))
+        finally:
+            writer.close()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        pass
+    else:
+        # Only replace a socket left behind by an earlier server.
+        if not stat.S_ISSOCK(mode):
+            raise FileExistsError(f"{path} exists and is not a socket")
+        os.unlink(path)
+    unix_server = await asyncio.start_unix_server(connected, path, limit=MAX_REQUEST)
+    try:
+        async with unix_server:
+            await stop.wait()
+    finally:
+        os.unlink(path)
+
+
+def serve(
+    executor: Executor,
+    socket_path: Optional[str] = None,
+    cache_size: int = 1024 * 1024 * 1024,
+    limits: Optional[Limits] = None,
+) -> None:
+    """Serves conversion requests on stdin and stdout, or on a Unix socket, pruning their caches on exit."""
+    server = Server(executor, cache_size, limits)
+    try:
+        if socket_path is None:
+            asyncio.run(_serve_stdio(server))
+        else:
+            asyncio.run(_serve_unix(server, socket_path))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.prune()
@@ -0,0 +1,80 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import BinaryIO, Iterable, Iterator
+
+from cursorgen.parser.base import Buffer
+
+
+class ConversionCache:
+    """Content-addressed on-disk cache of converted cursor files.
+
+    Entries are stored as `<directory>/<key[:2]>/<key>`, where the key hashes the input bytes together with the
+    conversion settings. Entry modification times are refreshed on every hit, and `prune` evicts the least recently
+    used entries once the cache grows beyond `max_size` bytes.
+    """
+
+    def __init__(self, directory: str, max_size: int) -> None:
+        self.directory = directory
+        self.max_size = max_size
+
+    @staticmethod
+    def key(blob: Buffer, version: int, sizes: Iterable[int], **options: object) -> str:
+        digest = hashlib.sha256(blob)
+        digest.update(f":{version}:{','.join(map(str, sorted(set(sizes))))}".encode())
+        for name, value in sorted(options.items()):
+            digest.update(f":{name}={value!r}".encode())
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def fetch(self, key: str, output: str) -> bool:
+        """Copies the entry for key to output, returning False if there is no such entry."""
+        entry = self.path(key)
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            return False
+
+        # Outputs are copied rather than hard linked, since rewriting a linked output in place would corrupt the entry.
+        if os.path.lexists(output):
+            os.unlink(output)
+        shutil.copyfile(entry, output)
+        return True
+
+    @contextmanager
+    def store(self, key: str) -> Iterator[BinaryIO]:
+        """Opens a new entry for writing; it only becomes visible once the block completes without error."""
+        entry = self.path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(entry), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                yield f
+            os.replace(temp, entry)
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+    def prune(self) -> None:
+        """Evicts least recently used entries until the cache fits in max_size bytes."""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith(".tmp-"):
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            os.unlink(path)
+            total -= size
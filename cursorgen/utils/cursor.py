@@ -1,32 +1,98 @@
-from typing import Iterator, List, Tuple
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional, Tuple, Union
 
-from PIL import Image
+if TYPE_CHECKING:
+    from PIL import Image
+
+Pixels = Union[bytes, memoryview]
 
 
 class CursorImage:
-    image: Image.Image
+    """A single cursor image at one nominal size, held as top-down BGRA pixels that may be decoded lazily."""
+
+    __slots__ = ("width", "height", "hotspot", "nominal", "chunk", "depth", "_pixels", "_loader")
+
+    width: int
+    height: int
     hotspot: Tuple[int, int]
     nominal: int
+    # The whole Xcursor chunk (header and pixels) the image was read from, which writers can copy as is.
+    chunk: Optional[memoryview]
+    # Bits per pixel of the source image.
+    depth: int
 
-    def __init__(self, image: Image.Image, hotspot: Tuple[int, int], nominal: int) -> None:
-        self.image = image
+    def __init__(
+        self,
+        pixels: Union[Pixels, Callable[[], Pixels]],
+        hotspot: Tuple[int, int],
+        nominal: int,
+        size: Tuple[int, int],
+        chunk: Optional[memoryview] = None,
+        depth: int = 32,
+    ) -> None:
+        self._pixels: Optional[Pixels] = None
+        self._loader: Optional[Callable[[], Pixels]] = None
+        if isinstance(pixels, (bytes, memoryview)):
+            self._pixels = pixels
+        else:
+            self._loader = pixels
+        self.width, self.height = size
         self.hotspot = hotspot
         self.nominal = nominal
+        self.chunk = chunk
+        self.depth = depth
+
+    @classmethod
+    def from_image(cls, image: "Image.Image", hotspot: Tuple[int, int], nominal: int) -> "CursorImage":
+        if image.mode != "RGBA":
+            image = image.convert("RGBA")
+        return cls(image.tobytes("raw", "BGRA"), hotspot, nominal, image.size)
+
+    @property
+    def pixels(self) -> Pixels:
+        """Gets the pixels, decoding them on first access and again after release."""
+        if self._pixels is None:
+            assert self._loader is not None
+            self._pixels = self._loader()
+        return self._pixels
+
+    @property
+    def image(self) -> "Image.Image":
+        from PIL import Image
+
+        return Image.frombytes("RGBA", self.size, self.pixels, "raw", "BGRA")
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+    @property
+    def loaded(self) -> bool:
+        return self._pixels is not None
+
+    def release(self) -> None:
+        """Drops decoded pixels to free their memory. Pixels that were given directly are kept."""
+        if self._loader is not None:
+            self._pixels = None
 
     def __repr__(self) -> str:
-        return (
-            f'CursorImage(image="Image with size {self.image.size}", '
-            f"hotspot={self.hotspot!r}, nominal={self.nominal!r})"
-        )
+        return f"CursorImage(size={self.size!r}, hotspot={self.hotspot!r}, nominal={self.nominal!r})"
 
 
 class CursorFrame:
+    """The images of one animation step. Steps that show the same frame share its CursorImage objects."""
+
+    __slots__ = ("images", "delay", "delay_ms")
+
     images: List[CursorImage]
-    delay: int
+    delay: float
+    # The delay in whole milliseconds, as written to Xcursor files. Parsers give it exactly, since not every number of
+    # milliseconds survives the conversion to seconds and back.
+    delay_ms: int
 
-    def __init__(self, images: List[CursorImage], delay: int = 0) -> None:
+    def __init__(self, images: List[CursorImage], delay: float = 0, delay_ms: Optional[int] = None) -> None:
         self.images = images
         self.delay = delay
+        self.delay_ms = int(delay * 1000) if delay_ms is None else delay_ms
 
     def __getitem__(self, item: int) -> CursorImage:
         return self.images[item]
@@ -0,0 +1,74 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, NamedTuple, Optional
+
+
+class Limits(NamedTuple):
+    """Upper bounds on the work a single input file can cause, checked from headers before decoding."""
+
+    # Total size of the decoded source images.
+    pixels: int = 1 << 27
+    # Animation frames and steps.
+    frames: int = 1 << 14
+    steps: int = 1 << 16
+    # Chunks or entries in an input container, and image chunks written.
+    chunks: int = 1 << 20
+    # Size of the Xcursor file written.
+    output_bytes: int = 1 << 30
+    # Wall-clock budget for the conversion, checked between frames and chunks.
+    seconds: Optional[float] = None
+
+
+class LimitExceeded(ValueError):
+    pass
+
+
+class _Usage:
+    __slots__ = ("limits", "pixels", "deadline")
+
+    def __init__(self, limits: Limits) -> None:
+        self.limits = limits
+        self.pixels = 0
+        self.deadline = None if limits.seconds is None else time.monotonic() + limits.seconds
+
+
+_current: "ContextVar[Optional[_Usage]]" = ContextVar("cursorgen_limits", default=None)
+_DEFAULT = Limits()
+
+
+def check(name: str, value: int) -> None:
+    """Raises LimitExceeded if value is over limit name of the enforced Limits, or of the default ones."""
+    usage = _current.get()
+    maximum: int = getattr(_DEFAULT if usage is None else usage.limits, name)
+    if value > maximum:
+        raise LimitExceeded(f"Too many {name.replace('_', ' ')}: {value}, the limit is {maximum}")
+
+
+def charge_pixels(width: int, height: int) -> None:
+    """Adds an image that is about to be created to the decoded pixels, raising LimitExceeded once they are over the
+    limit. Outside of enforce, each image is checked on its own.
+    """
+    usage = _current.get()
+    if usage is None:
+        check("pixels", width * height)
+        return
+    usage.pixels += width * height
+    check("pixels", usage.pixels)
+
+
+def check_time() -> None:
+    """Raises LimitExceeded if the time budget of the enforced Limits is used up."""
+    usage = _current.get()
+    if usage is not None and usage.deadline is not None and time.monotonic() > usage.deadline:
+        raise LimitExceeded(f"Time budget of {usage.limits.seconds:g}s exceeded")
+
+
+@contextmanager
+def enforce(limits: Limits) -> Iterator[Limits]:
+    """Enforces limits on the enclosed block converting a single file, summing its pixels and timing it from entry."""
+    token = _current.set(_Usage(limits))
+    try:
+        yield limits
+    finally:
+        _current.reset(token)
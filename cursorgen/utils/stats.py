@@ -0,0 +1,166 @@
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import (
+    Any,
+    ContextManager,
+    DefaultDict,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Type,
+)
+
+STAGES = ["read", "sniff", "parse", "decode", "resize", "pack", "write"]
+
+_current: "ContextVar[Optional[Stats]]" = ContextVar("cursorgen_stats", default=None)
+# Blocks of collect tracing memory, and whether collect started tracemalloc, which the last of them then stops.
+_tracing_lock = threading.Lock()
+_tracing_blocks = 0
+_started_tracing = False
+
+
+class Stats:
+    """Per-stage wall time and counters for one conversion, or an aggregate of several.
+
+    Stages are timed exclusively: while a nested stage runs (e.g. BMP decoding during ANI parsing), time is charged
+    to the nested stage only. Time spent outside of any stage is reported as "other".
+    """
+
+    def __init__(self, name: str = "", files: int = 1) -> None:
+        self.name = name
+        self.files = files
+        self.wall = 0.0
+        self.peak_memory = 0
+        self.stages: DefaultDict[str, float] = defaultdict(float)
+        self.counters: DefaultDict[str, int] = defaultdict(int)
+        self._active: List[str] = []
+        self._since = 0.0
+
+    def _enter(self, name: str) -> None:
+        now = time.perf_counter()
+        if self._active:
+            self.stages[self._active[-1]] += now - self._since
+        self._active.append(name)
+        self._since = now
+
+    def _exit(self) -> None:
+        now = time.perf_counter()
+        self.stages[self._active.pop()] += now - self._since
+        self._since = now
+
+    def merge(self, other: "Stats") -> None:
+        self.files += other.files
+        self.wall += other.wall
+        self.peak_memory = max(self.peak_memory, other.peak_memory)
+        for name, seconds in other.stages.items():
+            self.stages[name] += seconds
+        for name, value in other.counters.items():
+            self.counters[name] += value
+
+    def to_dict(self) -> Dict[str, Any]:
+        stages = {name: self.stages[name] for name in STAGES if name in self.stages}
+        stages.update((name, seconds) for name, seconds in self.stages.items() if name not in stages)
+        stages["other"] = max(0.0, self.wall - sum(self.stages.values()))
+        return {
+            "name": self.name,
+            "files": self.files,
+            "wall": self.wall,
+            "stages": stages,
+            "counters": dict(self.counters),
+            "peak_memory": self.peak_memory,
+        }
+
+    def format(self) -> str:
+        data = self.to_dict()
+        stages = ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in data["stages"].items())
+        counters = ", ".join(f"{name} {value}" for name, value in data["counters"].items())
+        return (
+            f"{self.name}: {self.wall * 1000:.1f}ms ({stages}); {counters}; "
+            f"peak traced memory {self.peak_memory / 1024:.0f}KiB"
+        )
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["_active"] = []
+        return state
+
+
+class _Stage:
+    __slots__ = ("stats", "name")
+
+    def __init__(self, stats: Stats, name: str) -> None:
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.stats._enter(self.name)
+
+    def __exit__(self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException], tb: Any) -> None:
+        self.stats._exit()
+
+
+class _NullStage:
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException], tb: Any) -> None:
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name: str) -> ContextManager[None]:
+    """Times the enclosed block as stage name of the Stats being collected, if any."""
+    stats = _current.get()
+    if stats is None:
+        return _NULL_STAGE
+    return _Stage(stats, name)
+
+
+def count(name: str, value: int = 1) -> None:
+    """Adds value to counter name of the Stats being collected, if any."""
+    stats = _current.get()
+    if stats is not None:
+        stats.counters[name] += value
+
+
+@contextmanager
+def collect(stats: Optional[Stats] = None, trace_memory: bool = True) -> Iterator[Stats]:
+    """Collects stage timings and counters of the enclosed block into stats.
+
+    With trace_memory, tracemalloc is started if needed, and stopped again afterwards, and its peak is recorded. The
+    peak is process-wide, so it is only attributable to a single conversion if conversions do not run concurrently in
+    threads.
+    """
+    global _tracing_blocks, _started_tracing
+    if stats is None:
+        stats = Stats()
+    if trace_memory:
+        with _tracing_lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _started_tracing = True
+            elif hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            _tracing_blocks += 1
+
+    token = _current.set(stats)
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.wall += time.perf_counter() - start
+        _current.reset(token)
+        if trace_memory:
+            with _tracing_lock:
+                stats.peak_memory = max(stats.peak_memory, tracemalloc.get_traced_memory()[1])
+                _tracing_blocks -= 1
+                if not _tracing_blocks and _started_tracing:
+                    tracemalloc.stop()
+                    _started_tracing = False
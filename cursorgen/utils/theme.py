@@ -0,0 +1,280 @@
+import csv
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Windows cursor roles in the order they appear in a "Control Panel\Cursors\Schemes" value.
+SCHEME_ROLES = [
+    "Arrow",
+    "Help",
+    "AppStarting",
+    "Wait",
+    "Crosshair",
+    "IBeam",
+    "NWPen",
+    "No",
+    "SizeNS",
+    "SizeWE",
+    "SizeNWSE",
+    "SizeNESW",
+    "SizeAll",
+    "UpArrow",
+    "Hand",
+    "Pin",
+    "Person",
+]
+
+# Conventional [Strings] keys naming each role, used when an install.inf does not register a scheme.
+STRING_ROLES = {
+    "pointer": "Arrow",
+    "help": "Help",
+    "work": "AppStarting",
+    "busy": "Wait",
+    "cross": "Crosshair",
+    "precision": "Crosshair",
+    "text": "IBeam",
+    "hand": "NWPen",
+    "handwriting": "NWPen",
+    "unavailable": "No",
+    "unavailiable": "No",
+    "vert": "SizeNS",
+    "horz": "SizeWE",
+    "dgn1": "SizeNWSE",
+    "dgn2": "SizeNESW",
+    "move": "SizeAll",
+    "alternate": "UpArrow",
+    "link": "Hand",
+    "pin": "Pin",
+    "person": "Person",
+}
+
+# X11 cursor names for each Windows role. The first name is the converted file, the rest are symlinks to it.
+X11_NAMES = {
+    "Arrow": ["default", "left_ptr", "arrow", "top_left_arrow"],
+    "Help": [
+        "help",
+        "question_arrow",
+        "whats_this",
+        "left_ptr_help",
+        "5c6cd98b3f3ebcb1f9c7f1c204630408",
+        "d9ce0ab605698f320427677b458ad60b",
+    ],
+    "AppStarting": [
+        "progress",
+        "left_ptr_watch",
+        "half-busy",
+        "00000000000000020006000e7e9ffc3f",
+        "08e8e1c95fe2fc01f976f1e063a24ccd",
+        "3ecb610c1bf2410f44200f48c40d3599",
+    ],
+    "Wait": ["wait", "watch", "0426c94ea35c87780ff01dc239897213"],
+    "Crosshair": ["crosshair", "cross", "tcross", "cross_reverse", "diamond_cross"],
+    "IBeam": ["text", "xterm", "ibeam"],
+    "NWPen": ["pencil", "draft"],
+    "No": ["not-allowed", "no-drop", "crossed_circle", "circle", "forbidden", "03b6e0fcb3499374a867c041f52298f0"],
+    "SizeNS": [
+        "ns-resize",
+        "size_ver",
+        "v_double_arrow",
+        "sb_v_double_arrow",
+        "row-resize",
+        "n-resize",
+        "s-resize",
+        "top_side",
+        "bottom_side",
+        "00008160000006810000408080010102",
+    ],
+    "SizeWE": [
+        "ew-resize",
+        "size_hor",
+        "h_double_arrow",
+        "sb_h_double_arrow",
+        "col-resize",
+        "e-resize",
+        "w-resize",
+        "left_side",
+        "right_side",
+        "028006030e0e7ebffc7f7070c0600140",
+    ],
+    "SizeNWSE": [
+        "nwse-resize",
+        "size_fdiag",
+        "nw-resize",
+        "se-resize",
+        "top_left_corner",
+        "bottom_right_corner",
+        "c7088f0f3e6c8088236ef8e1e3e70000",
+    ],
+    "SizeNESW": [
+        "nesw-resize",
+        "size_bdiag",
+        "ne-resize",
+        "sw-resize",
+        "top_right_corner",
+        "bottom_left_corner",
+        "fcf1c3c7cd4491d801f1e1c78f100000",
+    ],
+    "SizeAll": [
+        "move",
+        "fleur",
+        "size_all",
+        "all-scroll",
+        "4498f0e0c1937ffe01fd06f973665830",
+        "9081237383d90e509aa00f00170e968f",
+    ],
+    "UpArrow": ["up-arrow", "center_ptr", "up_arrow", "sb_up_arrow"],
+    "Hand": [
+        "pointer",
+        "hand",
+        "hand1",
+        "hand2",
+        "pointing_hand",
+        "e29285e634086352946a0e7090d73106",
+        "9d800788f1b08800ae810202380a0822",
+    ],
+}
+
+INSTALL_INF = "install.inf"
+
+
+class WindowsTheme(NamedTuple):
+    name: str
+    directory: str
+    roles: Dict[str, str]
+
+
+class ThemePlan(NamedTuple):
+    """Conversions and links needed to build an X11 theme.
+
+    `conversions` maps each unique source file to the name of the single converted cursor, `links` maps every other
+    cursor name to the converted cursor it links to.
+    """
+
+    conversions: Dict[str, str]
+    links: Dict[str, str]
+
+
+def _read_inf(path: str) -> Dict[str, List[str]]:
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if data.startswith((b"\xff\xfe", b"\xfe\xff")):
+        text = data.decode("utf-16")
+    else:
+        try:
+            text = data.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            text = data.decode("cp1252", errors="replace")
+
+    sections: Dict[str, List[str]] = {}
+    lines: List[str] = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith(";"):
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            lines = sections.setdefault(line[1:-1].strip().lower(), [])
+        else:
+            lines.append(line)
+    return sections
+
+
+def _split(line: str) -> List[str]:
+    return next(csv.reader([line], skipinitialspace=True))
+
+
+def read_theme(directory: str) -> WindowsTheme:
+    """Reads the role to cursor file mapping of a Windows cursor theme from its install.inf."""
+    entries = {entry.lower(): entry for entry in os.listdir(directory)}
+    if INSTALL_INF not in entries:
+        raise ValueError(f"No {INSTALL_INF} found in {directory}")
+    sections = _read_inf(os.path.join(directory, entries[INSTALL_INF]))
+
+    strings: Dict[str, str] = {}
+    for line in sections.get("strings", []):
+        key, sep, value = line.partition("=")
+        if sep:
+            strings[key.strip().lower()] = value.split(";")[0].strip().strip('"')
+
+    def expand(value: str) -> str:
+        return re.sub(r"%([^%]+)%", lambda match: strings.get(match.group(1).lower(), ""), value)
+
+    def resolve(value: str) -> Optional[str]:
+        file_name = expand(value).replace("\\", "/").rsplit("/", 1)[-1].strip()
+        if not file_name:
+            return None
+        entry = entries.get(file_name.lower())
+        return os.path.join(directory, entry) if entry is not None else None
+
+    roles: Dict[str, str] = {}
+    for lines in sections.values():
+        for line in lines:
+            fields = _split(line)
+            if len(fields) < 2 or fields[0].upper() not in ("HKCU", "HKEY_CURRENT_USER"):
+                continue
+            key = fields[1].lower().rstrip("\\")
+            if key == r"control panel\cursors\schemes" and len(fields) >= 5:
+                for role, value in zip(SCHEME_ROLES, expand(fields[-1]).split(",")):
+                    source = resolve(value)
+                    if source is not None:
+                        roles.setdefault(role, source)
+            elif key == r"control panel\cursors" and len(fields) >= 5 and fields[2] in SCHEME_ROLES:
+                source = resolve(fields[-1])
+                if source is not None:
+                    roles.setdefault(fields[2], source)
+
+    if not roles:
+        for key, role in STRING_ROLES.items():
+            if key in strings:
+                source = resolve(strings[key])
+                if source is not None:
+                    roles.setdefault(role, source)
+
+    name = strings.get("scheme_name") or os.path.basename(os.path.normpath(directory))
+    return WindowsTheme(name, directory, roles)
+
+
+def plan_theme(theme: WindowsTheme) -> ThemePlan:
+    """Converts every unique source once, and links all other X11 names of its roles to that conversion."""
+    conversions: Dict[str, str] = {}
+    links: Dict[str, str] = {}
+    for role, names in X11_NAMES.items():
+        source = theme.roles.get(role)
+        if source is None:
+            continue
+        target = conversions.setdefault(source, names[0])
+        for name in names:
+            if name != target:
+                links.setdefault(name, target)
+    return ThemePlan(conversions, links)
+
+
+def write_links(cursors_dir: str, links: Dict[str, str]) -> List[Tuple[str, str]]:
+    """Creates relative symlinks in cursors_dir, returning the (name, target) pairs whose target is missing."""
+    missing = []
+    for name, target in links.items():
+        if not os.path.exists(os.path.join(cursors_dir, target)):
+            missing.append((name, target))
+            continue
+        path = os.path.join(cursors_dir, name)
+        if os.path.lexists(path):
+            os.unlink(path)
+        os.symlink(target, path)
+    return missing
+
+
+def theme_dir_name(theme: WindowsTheme) -> str:
+    """Gets a directory name for theme that cannot escape the output directory, such as one for SCHEME_NAME "..".
+
+    Path separators are replaced and leading dots stripped, falling back to the name of the source directory.
+    """
+    for name in (theme.name, os.path.basename(os.path.abspath(theme.directory))):
+        name = re.sub(r"[/\\\0]", "_", name).strip().lstrip(".")
+        if name:
+            return name
+    return "theme"
+
+
+def write_index_theme(theme_dir: str, name: str) -> None:
+    with open(os.path.join(theme_dir, "index.theme"), "w") as f:
+        f.write(f"[Icon Theme]\nName={name}\nComment={name} cursor theme, converted by cursorgen\n")
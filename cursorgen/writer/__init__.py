@@ -1,6 +1,6 @@
-from cursorgen.writer.x11 import to_x11
+from cursorgen.writer.x11 import to_x11, write_x11
 
-__all__ = ["to_x11"]
+__all__ = ["to_x11", "write_x11"]
 
 CONVERTERS = {
     "x11": (to_x11, ""),
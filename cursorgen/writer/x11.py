@@ -1,68 +1,396 @@
-from itertools import chain
-from operator import itemgetter
-from typing import Iterable, List, Optional
-
-from PIL import Image
+import hashlib
+import io
+from collections import OrderedDict, deque
+from contextlib import ExitStack
+from functools import lru_cache
+from itertools import groupby
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 from cursorgen.parser import XCursorParser
-from cursorgen.utils.cursor import CursorFrame
+from cursorgen.utils.cursor import CursorFrame, CursorImage, Pixels
+from cursorgen.utils.limits import check, check_time
+from cursorgen.utils.stats import count, stage
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, Future
+
+    import numpy as np
 
 SIZES = [22, 24, 28, 32, 36, 40, 48, 56, 64, 72, 80, 88, 96]
+# Bump whenever the bytes written for the same input change, so cached conversions are invalidated.
+VERSION = 7
+RESIZE_CACHE_SIZE = 256
+# Names of the PIL resampling filters that can be used, which PIL is only imported for when needed.
+RESAMPLE = ("nearest", "box", "lanczos")
+
+
+@lru_cache(maxsize=None)
+def _nearest(source: int, target: int) -> "np.typing.NDArray[np.intp]":
+    """Source coordinates sampled by PIL's nearest neighbour resize along one axis.
+
+    PIL steps through the source by accumulating the scale factor from the first pixel center; the cumulative sum
+    reproduces its rounding exactly.
+    """
+    import numpy as np
+
+    scale = source / target
+    steps = np.full(target, scale)
+    steps[0] = scale * 0.5
+    coordinates = np.minimum(np.cumsum(steps).astype(np.intp), source - 1)
+    coordinates.flags.writeable = False
+    return coordinates
+
+
+def scale(image: CursorImage, size: int) -> Tuple[int, int, int, int]:
+    """Gets the width, height and hotspot of image scaled to nominal size, keeping its aspect ratio."""
+    factor = size / max(image.width, image.height)
+    width = max(1, round(image.width * factor))
+    height = max(1, round(image.height * factor))
+    hx, hy = image.hotspot
+    return width, height, min(int(hx * factor), width - 1), min(int(hy * factor), height - 1)
+
+
+def resize(image: CursorImage, width: int, height: int, resample: str = "nearest") -> Pixels:
+    """Scales the BGRA pixels of image to width x height.
+
+    Nearest neighbour sampling matches PIL's but runs on the raw pixels. Integer upscales with nearest or box
+    filtering are plain pixel replication; other box and Lanczos resizes go through PIL, which filters with
+    premultiplied alpha.
+    """
+    if image.size == (width, height):
+        return image.pixels
+    if resample not in RESAMPLE:
+        raise ValueError(f"Unknown resampling filter {resample!r}, expected one of {', '.join(RESAMPLE)}")
+
+    x_factor, x_extra = divmod(width, image.width)
+    y_factor, y_extra = divmod(height, image.height)
+    if resample == "lanczos" or (resample == "box" and (x_extra or y_extra or not x_factor or not y_factor)):
+        from PIL import Image
+
+        resized = image.image.resize((width, height), Image.Resampling[resample.upper()])
+        return resized.tobytes("raw", "BGRA")
+
+    import numpy as np
+
+    pixels = np.frombuffer(image.pixels, dtype="<u4").reshape(image.height, image.width)
+    if not x_extra and not y_extra and x_factor and y_factor:
+        return np.repeat(np.repeat(pixels, y_factor, axis=0), x_factor, axis=1).tobytes()
+    return pixels.take(_nearest(image.height, height), axis=0).take(_nearest(image.width, width), axis=1).tobytes()
+
+
+class ResizeCache:
+    """LRU cache of resized BGRA pixel data, keyed by source image identity and target dimensions.
+
+    Entries hold a reference to their source image so that its id cannot be reused while cached.
+    """
+
+    def __init__(self, maxsize: int = RESIZE_CACHE_SIZE, resample: str = "nearest") -> None:
+        self.maxsize = maxsize
+        self.resample = resample
+        self._entries: "OrderedDict[Tuple[int, int, int], Tuple[CursorImage, Pixels]]" = OrderedDict()
+
+    def lookup(self, image: CursorImage, width: int, height: int) -> Optional[Pixels]:
+        key = (id(image), width, height)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, image: CursorImage, width: int, height: int, image_data: Pixels) -> None:
+        if self.maxsize > 0:
+            self._entries[id(image), width, height] = (image, image_data)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, image: CursorImage, width: int, height: int) -> Pixels:
+        image_data = self.lookup(image, width, height)
+        if image_data is None:
+            with stage("resize"):
+                image_data = resize(image, width, height, self.resample)
+            self.put(image, width, height, image_data)
+        return image_data
+
+
+class ImageDigests:
+    """Memoized digests of source image pixels, keyed by image identity.
+
+    Resizing is deterministic, so images with equal digests produce identical chunks at every target size. With
+    release, the pixels of lazily decoded images are dropped again once they are hashed.
+    """
+
+    def __init__(self, release: bool = False) -> None:
+        self.release = release
+        self._digests: Dict[int, Tuple[CursorImage, bytes]] = {}
+
+    def get(self, image: CursorImage) -> bytes:
+        entry = self._digests.get(id(image))
+        if entry is None:
+            digest = hashlib.blake2b(f"{image.width}x{image.height}:".encode())
+            digest.update(image.pixels)
+            entry = self._digests[id(image)] = (image, digest.digest())
+            if self.release:
+                image.release()
+        return entry[1]
+
+
+def to_x11(
+    frames: Iterable[CursorFrame],
+    sizes: Optional[Iterable[int]] = None,
+    cache_size: int = RESIZE_CACHE_SIZE,
+    coalesce: bool = False,
+    resample: str = "nearest",
+    executor: Optional["Executor"] = None,
+    workers: int = 1,
+    stream: bool = False,
+    passthrough: bool = False,
+) -> bytes:
+    with io.BytesIO() as fp:
+        write_x11(frames, fp, sizes, cache_size, coalesce, resample, executor, workers, stream, passthrough)
+        return fp.getvalue()
 
 
-def to_x11(frames: List[CursorFrame], sizes: Optional[Iterable[int]] = None) -> bytes:
+_Chunk = Tuple[CursorImage, int, int, Tuple[int, int, int, int]]
+
+
+def _resize_all(image: CursorImage, dimensions: List[Tuple[int, int]], resample: str) -> List[Pixels]:
+    return [resize(image, width, height, resample) for width, height in dimensions]
+
+
+def _resize_ahead(chunks: List[_Chunk], cache: ResizeCache, executor: "Executor", window: int) -> Iterator[Pixels]:
+    """Yields the resized pixels of chunks in order, while resizing up to window source images ahead on executor.
+
+    Each task resizes one source image to all of its dimensions, to keep the overhead small next to fast resizes.
+    """
+    pending: "Deque[Tuple[List[_Chunk], Optional[Future[List[Pixels]]]]]" = deque()
+    inflight: "Dict[Tuple[int, int, int], Tuple[Future[List[Pixels]], int]]" = {}
+    groups = (list(group) for _, group in groupby(chunks, key=lambda chunk: id(chunk[0])))
+
+    def submit() -> None:
+        group = next(groups, None)
+        if group is None:
+            return
+        cursor = group[0][0]
+        dimensions: List[Tuple[int, int]] = []
+        for _, _, _, (width, height, _, _) in group:
+            if (
+                (id(cursor), width, height) not in inflight
+                and (width, height) not in dimensions
+                and cache.lookup(cursor, width, height) is None
+            ):
+                dimensions.append((width, height))
+        future = None
+        if dimensions:
+            future = executor.submit(_resize_all, cursor, dimensions, cache.resample)
+            for index, (width, height) in enumerate(dimensions):
+                inflight[id(cursor), width, height] = (future, index)
+        pending.append((group, future))
+
+    for _ in range(window):
+        submit()
+    while pending:
+        group, future = pending.popleft()
+        submit()
+        for cursor, _, _, (width, height, _, _) in group:
+            entry = inflight.get((id(cursor), width, height))
+            if entry is None:
+                yield cache.get(cursor, width, height)
+                continue
+            owner, index = entry
+            with stage("resize"):
+                image_data = owner.result()[index]
+            if owner is future:
+                del inflight[id(cursor), width, height]
+            cache.put(cursor, width, height, image_data)
+            yield image_data
+
+
+def _source_chunk(frame: CursorFrame, size: int) -> Optional[CursorImage]:
+    """Gets the image of frame that was read from an Xcursor chunk of nominal size, if there is one."""
+    for image in frame:
+        if image.chunk is not None and image.nominal == size:
+            return image
+    return None
+
+
+def select_source(images: Sequence[CursorImage], size: int) -> CursorImage:
+    """Picks the image to scale to size: an exact match, else the nearest larger, else the largest; deepest on ties."""
+    larger = [image for image in images if max(image.size) >= size]
+    if larger:
+        return min(larger, key=lambda image: (max(image.size), -image.depth))
+    return max(images, key=lambda image: (max(image.size), image.depth))
+
+
+def _coalesce(steps: List[Tuple[CursorFrame, int]], digests: ImageDigests) -> List[Tuple[CursorFrame, int]]:
+    """Merges consecutive frames with identical images into one step, summing their delays."""
+    result: List[Tuple[CursorFrame, int]] = []
+    previous = None
+    for frame, delay in steps:
+        check_time()
+        key = [(digests.get(cursor), cursor.hotspot) for cursor in frame]
+        if result and key == previous:
+            result[-1] = (result[-1][0], result[-1][1] + delay)
+        else:
+            result.append((frame, delay))
+        previous = key
+    return result
+
+
+def write_x11(
+    frames: Iterable[CursorFrame],
+    fp: BinaryIO,
+    sizes: Optional[Iterable[int]] = None,
+    cache_size: int = RESIZE_CACHE_SIZE,
+    # Merge consecutive identical frames into one, summing their delays.
+    coalesce: bool = False,
+    # One of RESAMPLE.
+    resample: str = "nearest",
+    # Resize on executor, or on a thread pool of `workers` threads if workers > 1, up to 2 * workers source images
+    # ahead of the chunk being written. The output is the same as when resizing serially.
+    executor: Optional["Executor"] = None,
+    workers: int = 1,
+    # Accept lazy frames such as BaseParser.iter_frames(), and only hold decoded images while they are hashed and
+    # while their chunks are written, decoding each twice. The output is the same.
+    stream: bool = False,
+    # Copy chunks of images read from Xcursor files at their own nominal sizes, unless coalesce merged their frame,
+    # and only scale images for the missing target sizes.
+    passthrough: bool = False,
+) -> int:
+    """Writes frames to fp as an Xcursor file and returns the number of bytes written.
+
+    Each frame gets one chunk per target size, scaled from select_source's image, and identical chunks are shared.
+    """
     if not sizes:
         sizes = set(SIZES)
     else:
         sizes = set(sizes)
+    if resample not in RESAMPLE:
+        raise ValueError(f"Unknown resampling filter {resample!r}, expected one of {', '.join(RESAMPLE)}")
+
+    digests = ImageDigests(release=stream)
+    steps = [(frame, frame.delay_ms) for frame in frames]
+    if coalesce:
+        steps = _coalesce(steps, digests)
+
+    if passthrough:
+        sizes |= {image.nominal for frame, _ in steps for image in frame if image.chunk is not None}
+
+    check("chunks", len(steps) * len(sizes))
+    # Each chunk is (source image, size, delay, whether the source chunk is copied as is).
+    chunks: List[Tuple[CursorImage, int, int, bool]] = []
+    for frame, delay in steps:
+        if not frame:
+            continue
+        # Frames merged by coalesce have a new delay, so their chunks cannot be copied.
+        copyable = passthrough and delay == frame.delay_ms
+        for size in sizes:
+            source = _source_chunk(frame, size) if copyable else None
+            if source is None:
+                chunks.append((select_source(frame.images, size), size, delay, False))
+            else:
+                chunks.append((source, size, delay, True))
+    count("frames", len(steps))
+    count("images", sum(len(frame) for frame, _ in steps))
+    count("chunks", len(chunks))
 
-    chunks = []
-    for frame in frames:
-        for cursor in frame:
-            hx, hy = cursor.hotspot
-            delay = int(frame.delay * 1000)
-            image = cursor.image
-            width, height = image.width, image.height
-            for size in sizes:
-                scale_factor = size / max(width, height)
-                x, y = (int(hx * scale_factor), int(hy * scale_factor))
-
-                new_image = image.resize((size, size), Image.Resampling.NEAREST)
-                # with io.BytesIO() as output:
-                #     image.save(output, format="PNG", optimize=True)
-                #     with Image.open(output) as compressed_image:
-                image_data = new_image.tobytes("raw", "BGRA")
-
-                header = XCursorParser.IMAGE_HEADER.pack(
-                    XCursorParser.IMAGE_HEADER.size,
+    with stage("pack"):
+        header = XCursorParser.FILE_HEADER.pack(
+            XCursorParser.MAGIC,
+            XCursorParser.FILE_HEADER.size,
+            XCursorParser.VERSION,
+            len(chunks),
+        )
+
+        offset = XCursorParser.FILE_HEADER.size + len(chunks) * XCursorParser.TOC_CHUNK.size
+        positions: Dict[Tuple[Any, ...], int] = {}
+        placements: Dict[Tuple[int, int], Tuple[int, int, int, int]] = {}
+        unique: List[_Chunk] = []
+        # Indices in unique of chunks copied from their source.
+        copies: Set[int] = set()
+        toc = []
+        for cursor, size, delay, copy in chunks:
+            check_time()
+            # Copied chunks are shared by the TOC entries of their source image, which needs no hashing.
+            key = ("copy", id(cursor)) if copy else (digests.get(cursor), cursor.hotspot, size, delay)
+            position = positions.get(key)
+            if position is None:
+                position = positions[key] = offset
+                if copy:
+                    placement = (cursor.width, cursor.height, *cursor.hotspot)
+                    copies.add(len(unique))
+                elif (id(cursor), size) in placements:
+                    placement = placements[id(cursor), size]
+                else:
+                    placement = placements[id(cursor), size] = scale(cursor, size)
+                unique.append((cursor, size, delay, placement))
+                offset += XCursorParser.IMAGE_HEADER.size + placement[0] * placement[1] * 4
+            toc.append(
+                XCursorParser.TOC_CHUNK.pack(
                     XCursorParser.CHUNK_IMAGE,
                     size,
-                    1,
-                    size,
-                    size,
-                    x,
-                    y,
-                    delay,
+                    position,
                 )
-                chunks.append((XCursorParser.CHUNK_IMAGE, size, header + image_data))
-
-    header = XCursorParser.FILE_HEADER.pack(
-        XCursorParser.MAGIC,
-        XCursorParser.FILE_HEADER.size,
-        XCursorParser.VERSION,
-        len(chunks),
-    )
-
-    offset = XCursorParser.FILE_HEADER.size + len(chunks) * XCursorParser.TOC_CHUNK.size
-    toc = []
-    for chunk_type, chunk_subtype, chunk in chunks:
-        toc.append(
-            XCursorParser.TOC_CHUNK.pack(
-                chunk_type,
-                chunk_subtype,
-                offset,
             )
-        )
-        offset += len(chunk)
+    count("unique_chunks", len(unique))
+    count("copied_chunks", len(copies))
+    check("output_bytes", offset)
+
+    with stage("write"):
+        written = fp.write(header)
+        written += fp.write(b"".join(toc))
+
+    # Index in unique of the last chunk scaled from each source image, after which it is released when streaming.
+    last_chunks = {id(cursor): index for index, (cursor, _, _, _) in enumerate(unique)} if stream else {}
+    cache = ResizeCache(0 if stream else cache_size, resample)
+    with ExitStack() as stack:
+        if workers > 1 and executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            executor = stack.enter_context(ThreadPoolExecutor(workers, thread_name_prefix="cursorgen-resize"))
+        if executor is not None:
+            resized = _resize_ahead(unique, cache, executor, workers * 2)
+        else:
+            resized = (cache.get(cursor, width, height) for cursor, _, _, (width, height, _, _) in unique)
+
+        for index, ((cursor, size, delay, (width, height, x, y)), image_data) in enumerate(zip(unique, resized)):
+            check_time()
+            with stage("pack"):
+                if index in copies:
+                    assert cursor.chunk is not None
+                    # Keep the source header, with the delay this step is written with.
+                    *fields, _ = XCursorParser.IMAGE_HEADER.unpack_from(cursor.chunk)
+                    header = XCursorParser.IMAGE_HEADER.pack(*fields, delay)
+                else:
+                    header = XCursorParser.IMAGE_HEADER.pack(
+                        XCursorParser.IMAGE_HEADER.size,
+                        XCursorParser.CHUNK_IMAGE,
+                        size,
+                        1,
+                        width,
+                        height,
+                        x,
+                        y,
+                        delay,
+                    )
+
+            with stage("write"):
+                written += fp.write(header)
+                written += fp.write(image_data)
+            if last_chunks.get(id(cursor)) == index:
+                cursor.release()
 
-    return b"".join(chain([header], toc, map(itemgetter(2), chunks)))
+    count("bytes_out", written)
+    return written